@@ -0,0 +1,95 @@
+"""
+Бенчмарк параллельного скачивания по диапазонам (drive_download.parallel_ranged_download).
+
+Поднимает локальный HTTP-сервер с поддержкой Range, который имитирует Drive:
+задержка на каждый запрос и ограничение скорости на одно соединение. Скачивает
+один и тот же файл с разным числом соединений и печатает пропускную способность.
+
+Пример:
+    python benchmark_drive_download.py --size-mb 256 --connections 1 2 4 8
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from drive_download import MiB, parallel_ranged_download
+
+
+def make_handler(data, latency, per_connection_bytes_per_second):
+    class RangeHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            start, end = 0, len(data) - 1
+            match = re.match(r'bytes=(\d+)-(\d+)?', self.headers.get('Range', ''))
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2)) if match.group(2) else end, len(data) - 1)
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+
+            block = 256 * 1024
+            block_seconds = block / per_connection_bytes_per_second
+            position = start
+            while position <= end:
+                sent_at = time.monotonic()
+                chunk = data[position:min(position + block, end + 1)]
+                self.wfile.write(chunk)
+                position += len(chunk)
+                time.sleep(max(0.0, block_seconds - (time.monotonic() - sent_at)))
+
+    return RangeHandler
+
+
+def run_benchmark(size_mb, connections_list, latency, per_connection_mbps):
+    data = os.urandom(size_mb * MiB)
+    md5_checksum = hashlib.md5(data).hexdigest()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(data, latency, per_connection_mbps * MiB))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/file'
+    work_dir = tempfile.mkdtemp(prefix='bench_download_')
+
+    print(f"Файл {size_mb} МБ, задержка запроса {latency * 1000:.0f} мс, лимит соединения {per_connection_mbps} МБ/с")
+    print(f"{'соединения':>10} {'время, с':>9} {'МБ/с':>8} {'ускорение':>10}")
+    baseline = None
+    try:
+        for connections in connections_list:
+            destination = os.path.join(work_dir, f'file_{connections}.bin')
+            started = time.perf_counter()
+            parallel_ranged_download(requests.Session, url, destination, len(data), md5_checksum,
+                                     connections=connections)
+            elapsed = time.perf_counter() - started
+            os.remove(destination)
+            throughput = size_mb / elapsed
+            baseline = baseline or throughput
+            print(f"{connections:>10} {elapsed:>9.2f} {throughput:>8.1f} {throughput / baseline:>9.2f}x")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=128)
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--per-connection-mbps', type=float, default=16, help='лимит скорости одного соединения, МБ/с')
+    args = parser.parse_args()
+    run_benchmark(args.size_mb, args.connections, args.latency_ms / 1000, args.per_connection_mbps)
@@ -0,0 +1,55 @@
+"""
+Бенчмарк локального движка транскрибации (faster-whisper, CPU).
+
+Меряет real-time factor (RTF = время обработки / длительность аудио) при разном
+числе процессов и RTF на ядро (RTF * задействованные ядра, т.е. секунд CPU на
+секунду аудио). Модель загружается до замера (прогрев), чтобы не учитывать ее загрузку.
+
+Пример:
+    python benchmark_local_whisper.py meeting.wav --workers 1 2 4 --model small
+"""
+import argparse
+import os
+import time
+
+import voicy_functions as voicy
+from transcription_backends import LocalWhisperBackend
+
+
+def run_benchmark(audio_path, workers_list, model_size, compute_type, cpu_threads, chunk_seconds, language):
+    duration_seconds = voicy.get_audio_duration_minutes(audio_path) * 60
+    if duration_seconds <= 0:
+        raise SystemExit(f"Не удалось определить длительность {audio_path}")
+    profile = voicy.build_transcription_profile({'language': language})
+
+    print(f"Аудио: {audio_path}, {duration_seconds:.1f} с; модель {model_size} ({compute_type}), "
+          f"потоков на процесс: {cpu_threads}, фрагмент: {chunk_seconds} с")
+    print(f"{'процессы':>9} {'ядра':>5} {'время, с':>9} {'RTF':>7} {'RTF/ядро':>9} {'x real-time':>12}")
+    for workers in workers_list:
+        backend = LocalWhisperBackend(model_size=model_size, compute_type=compute_type, workers=workers,
+                                      cpu_threads=cpu_threads, chunk_seconds=chunk_seconds)
+        try:
+            # Прогрев: поднимаем все процессы пула и загружаем в них модель
+            list(backend._get_pool().map(time.sleep, [0.5] * workers))
+            started = time.perf_counter()
+            backend.transcribe(audio_path, profile, duration_minutes=duration_seconds / 60)
+            elapsed = time.perf_counter() - started
+        finally:
+            backend.close()
+        cores = workers * cpu_threads
+        rtf = elapsed / duration_seconds
+        print(f"{workers:>9} {cores:>5} {elapsed:>9.1f} {rtf:>7.3f} {rtf * cores:>9.3f} {1 / rtf:>12.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('audio_path')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, max(1, (os.cpu_count() or 1) // 2), os.cpu_count() or 1])
+    parser.add_argument('--model', default='small')
+    parser.add_argument('--compute-type', default='int8')
+    parser.add_argument('--cpu-threads', type=int, default=1)
+    parser.add_argument('--chunk-seconds', type=int, default=60)
+    parser.add_argument('--language', default='ru-RU')
+    args = parser.parse_args()
+    run_benchmark(args.audio_path, sorted(set(args.workers)), args.model, args.compute_type,
+                  args.cpu_threads, args.chunk_seconds, args.language)
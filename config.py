@@ -23,4 +23,53 @@ media_mime_types = [
     'application/vnd.google-apps.video'  # Для видео, загруженных в Google Диск
 ]
 downloaded_file_path = 'downloaded_video.mp4'
-audio_file_path = 'extracted_audio.wav'
\ No newline at end of file
+audio_file_path = 'extracted_audio.wav'
+
+# speech (значения по умолчанию для профиля транскрибации; переопределяются колонками таблицы маппинга)
+SPEECH_LANGUAGE_CODE = "ru-RU"
+SPEECH_ALTERNATIVE_LANGUAGE_CODES = []  # например ["en-US"]
+SPEECH_MODEL = "latest_long"
+SPEECH_CHANNEL_MODE = "stereo"  # stereo | mono
+SPEECH_MIN_SPEAKERS = 2
+SPEECH_MAX_SPEAKERS = 6
+# Маршрутизация моделей: короткие встречи отправляются в отдельную модель ("" - не использовать).
+# latest_short рассчитана на реплики в несколько секунд (команды) и для встреч не подходит
+SPEECH_SHORT_MODEL = "default"
+SPEECH_SHORT_AUDIO_MAX_MINUTES = 10.0
+
+# Движок транскрибации по умолчанию: google | whisper (колонка backend в таблице маппинга переопределяет)
+TRANSCRIPTION_BACKEND = "google"
+# Локальный движок (faster-whisper, CPU)
+WHISPER_MODEL_SIZE = "small"
+WHISPER_COMPUTE_TYPE = "int8"
+WHISPER_WORKERS = 0  # 0 - по числу ядер / WHISPER_CPU_THREADS
+WHISPER_CPU_THREADS = 1
+WHISPER_CHUNK_SECONDS = 300
+WHISPER_CHUNK_OVERLAP_SECONDS = 10  # перекрытие фрагментов, чтобы не терять слова на границах
+WHISPER_BEAM_SIZE = 1
+
+# Хранилище полных транскриптов: локальная папка или "gs://bucket/prefix"; в таблицу пишется отрывок и ссылка
+TRANSCRIPT_STORE_URI = "transcripts"
+TRANSCRIPT_EXCERPT_CHARS = 500
+
+# Операции Speech-to-Text: файл состояния (переживает перезапуск) и адаптивный интервал опроса
+SPEECH_OPERATIONS_STATE_FILE = "speech_operations.json"
+SPEECH_POLL_MIN_SECONDS = 15
+SPEECH_POLL_MAX_SECONDS = 300
+SPEECH_OPERATION_MAX_HOURS = 24
+SPEECH_POLL_MAX_FAILURES = 10  # операция, которую не удается опросить столько раз подряд, завершается с ошибкой
+
+# Логирование: JSON-строки с trace_id/meeting_id; уровни для отдельных модулей (дополняют voicy_logging.DEFAULT_MODULE_LEVELS)
+LOG_LEVEL = "INFO"
+LOG_JSON = True
+LOG_MODULE_LEVELS = {}  # например {"voicy_functions": "DEBUG", "googleapiclient": "WARNING"}
+LOG_SAMPLE_EVERY = 100  # частые события (прогресс скачивания, смена спикера) пишутся раз в N
+
+# Скачивание с Google Drive: параллельные Range-запросы (начальный размер диапазона подстраивается под скорость)
+DRIVE_DOWNLOAD_CONNECTIONS = 4
+DRIVE_DOWNLOAD_CHUNK_MB = 8
+
+# Очередь обработки: справедливое разделение между маппингами (колонки priority и weight в таблице маппинга)
+SCHEDULER_WORKERS = 2  # файлов, обрабатываемых одновременно
+SCHEDULER_MAX_WAIT_MINUTES = 60  # файл, ждущий дольше, обрабатывается вне очереди
+SCHEDULER_DEFAULT_JOB_MINUTES = 30  # оценка длительности, если Drive ее не сообщает
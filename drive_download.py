@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+DRIVE_MEDIA_URL = "https://www.googleapis.com/drive/v3/files/{file_id}?alt=media&supportsAllDrives=true"
+
+MiB = 1024 * 1024
+
+
+class DownloadError(Exception):
+    """Ошибка скачивания по диапазонам (частично скачанный файл сохраняется для докачки)."""
+
+
+class _RangePlanner:
+    """
+    Раздает потокам диапазоны байтов [start, end) из еще не скачанных участков файла
+    и учитывает скачанные (для докачки после прерывания).
+    """
+
+    def __init__(self, total_size, done_ranges=()):
+        self.total_size = total_size
+        self._lock = threading.Lock()
+        self._done = _merge_ranges(done_ranges)
+        self._gaps = _invert_ranges(self._done, total_size)
+
+    def claim(self, size):
+        with self._lock:
+            if not self._gaps:
+                return None
+            start, end = self._gaps[0]
+            claim_end = min(end, start + size)
+            if claim_end == end:
+                self._gaps.pop(0)
+            else:
+                self._gaps[0] = (claim_end, end)
+            return start, claim_end
+
+    def release(self, start, end):
+        """Возвращает нескачанный диапазон в очередь."""
+        if start >= end:
+            return
+        with self._lock:
+            self._gaps.insert(0, (start, end))
+
+    def complete(self, start, end):
+        if start >= end:
+            return
+        with self._lock:
+            self._done = _merge_ranges(self._done + [(start, end)])
+
+    def has_gaps(self):
+        with self._lock:
+            return bool(self._gaps)
+
+    def done_ranges(self):
+        with self._lock:
+            return list(self._done)
+
+    def done_bytes(self):
+        with self._lock:
+            return sum(end - start for start, end in self._done)
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(tuple(r) for r in ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _invert_ranges(done, total_size):
+    gaps = []
+    position = 0
+    for start, end in done:
+        if start > position:
+            gaps.append((position, start))
+        position = max(position, end)
+    if position < total_size:
+        gaps.append((position, total_size))
+    return gaps
+
+
+def _state_path(destination_path):
+    return destination_path + '.download.json'
+
+
+def _load_state(destination_path, total_size, md5_checksum):
+    """Скачанные диапазоны от прошлой попытки, если она относится к этому же файлу."""
+    state_path = _state_path(destination_path)
+    if not (os.path.exists(state_path) and os.path.exists(destination_path)):
+        return None
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (state.get('size') != total_size or state.get('md5Checksum') != md5_checksum
+            or os.path.getsize(destination_path) != total_size):
+        return None
+    return state.get('done', [])
+
+
+def _save_state(destination_path, total_size, md5_checksum, done_ranges):
+    state_path = _state_path(destination_path)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'size': total_size, 'md5Checksum': md5_checksum, 'done': done_ranges}, f)
+    os.replace(tmp_path, state_path)
+
+
+def remove_partial_download(destination_path):
+    """Удаляет частично скачанный файл и его состояние докачки."""
+    for path in (destination_path, _state_path(destination_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def file_md5(path, block_size=8 * MiB):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _preallocate(destination_path, total_size):
+    os.makedirs(os.path.dirname(os.path.abspath(destination_path)), exist_ok=True)
+    fd = os.open(destination_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if hasattr(os, 'posix_fallocate') and total_size:
+            os.posix_fallocate(fd, 0, total_size)
+        else:
+            os.ftruncate(fd, total_size)
+    finally:
+        os.close(fd)
+
+
+def parallel_ranged_download(session_factory, url, destination_path, total_size, md5_checksum=None,
+                             connections=4, initial_chunk_size=8 * MiB, min_chunk_size=1 * MiB,
+                             max_chunk_size=64 * MiB, target_chunk_seconds=2.0, max_retries=3,
+                             timeout=60, state_save_interval=5.0):
+    """
+    Скачивает файл несколькими параллельными HTTP Range-запросами в заранее выделенный файл.
+
+    Каждый поток берет следующий нескачанный диапазон и подстраивает его размер так,
+    чтобы один запрос занимал около target_chunk_seconds (быстрое соединение - крупнее
+    диапазоны и меньше запросов, медленное - мельче и дешевле повтор). Скачанные диапазоны
+    периодически сохраняются в <destination_path>.download.json: повторный вызов после
+    прерывания докачивает только недостающее. В конце проверяется md5 (md5Checksum Drive).
+
+    Args:
+        session_factory: Функция без аргументов, возвращающая requests.Session-совместимый
+            объект (свой на каждый поток), например AuthorizedSession для Drive.
+        url (str): URL содержимого файла, поддерживающий заголовок Range.
+        destination_path (str): Куда сохранить файл.
+        total_size (int): Размер файла в байтах.
+        md5_checksum (str, optional): Ожидаемый md5 (hex).
+        connections (int): Число параллельных соединений.
+
+    Raises:
+        DownloadError: Диапазон не удалось скачать за max_retries попыток подряд
+            (состояние докачки сохраняется) или не совпал md5 (файл удаляется).
+    """
+    done_ranges = _load_state(destination_path, total_size, md5_checksum)
+    if done_ranges is None:
+        _preallocate(destination_path, total_size)
+        done_ranges = []
+        _save_state(destination_path, total_size, md5_checksum, done_ranges)
+    planner = _RangePlanner(total_size, done_ranges)
+    if done_ranges:
+        logger.info("Докачка %s: уже скачано %d из %d байт.", destination_path, planner.done_bytes(), total_size)
+
+    stop = threading.Event()
+    errors = []
+    state_lock = threading.Lock()
+    last_save = [time.monotonic()]
+
+    def maybe_save_state(force=False):
+        with state_lock:
+            if force or time.monotonic() - last_save[0] >= state_save_interval:
+                _save_state(destination_path, total_size, md5_checksum, planner.done_ranges())
+                last_save[0] = time.monotonic()
+
+    def worker():
+        session = session_factory()
+        chunk_size = initial_chunk_size
+        failures = 0
+        fd = os.open(destination_path, os.O_WRONLY)
+        try:
+            while not stop.is_set():
+                claim = planner.claim(chunk_size)
+                if claim is None:
+                    return
+                start, end = claim
+                offset = start
+                started = time.monotonic()
+                try:
+                    response = session.get(url, headers={'Range': f'bytes={start}-{end - 1}'}, stream=True, timeout=timeout)
+                    try:
+                        if response.status_code != 206:
+                            raise DownloadError(f"сервер ответил {response.status_code} на Range-запрос bytes={start}-{end - 1}")
+                        for block in response.iter_content(chunk_size=MiB):
+                            if offset + len(block) > end:
+                                raise DownloadError(f"сервер вернул больше данных, чем запрошено (bytes={start}-{end - 1})")
+                            os.pwrite(fd, block, offset)
+                            offset += len(block)
+                    finally:
+                        response.close()
+                    if offset != end:
+                        raise DownloadError(f"неполный ответ: {offset - start} из {end - start} байт")
+                except Exception as e:
+                    # Уже записанную часть диапазона не скачиваем повторно
+                    planner.complete(start, offset)
+                    planner.release(offset, end)
+                    failures += 1
+                    chunk_size = max(min_chunk_size, chunk_size // 2)
+                    logger.warning("Ошибка скачивания диапазона %d-%d (попытка %d): %s", start, end - 1, failures, e)
+                    if failures > max_retries:
+                        errors.append(e)
+                        stop.set()
+                        return
+                    time.sleep(min(2 ** failures, 30))
+                    continue
+
+                failures = 0
+                planner.complete(start, end)
+                maybe_save_state()
+                elapsed = time.monotonic() - started
+                if elapsed < target_chunk_seconds / 2:
+                    chunk_size = min(max_chunk_size, chunk_size * 2)
+                elif elapsed > target_chunk_seconds * 2:
+                    chunk_size = max(min_chunk_size, chunk_size // 2)
+        finally:
+            os.close(fd)
+            # У каждого потока свой пул соединений - не оставляем его открытым до сборки мусора
+            session.close()
+
+    started = time.monotonic()
+    # Диапазон, возвращенный после ошибки, мог остаться без потока, если остальные уже
+    # закончили работу, - тогда запускаем потоки еще раз
+    while planner.has_gaps() and not errors:
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            futures = [pool.submit(worker) for _ in range(connections)]
+            for future in futures:
+                future.result()
+
+    if errors or planner.done_bytes() != total_size:
+        maybe_save_state(force=True)
+        raise DownloadError(f"скачано {planner.done_bytes()} из {total_size} байт: {errors[0] if errors else 'нет ошибки'}")
+
+    elapsed = time.monotonic() - started
+    logger.info("Скачано %d байт в %d соединений за %.1f с (%.1f МБ/с).",
+                total_size, connections, elapsed, total_size / MiB / max(elapsed, 1e-6))
+
+    if md5_checksum:
+        actual_md5 = file_md5(destination_path)
+        if actual_md5 != md5_checksum:
+            remove_partial_download(destination_path)
+            raise DownloadError(f"md5 не совпадает: ожидался {md5_checksum}, получен {actual_md5}")
+    if os.path.exists(_state_path(destination_path)):
+        os.remove(_state_path(destination_path))
+    return True
@@ -0,0 +1,198 @@
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def estimate_file_minutes(file_info, default_minutes):
+    """
+    Оценка длительности записи до скачивания: videoMediaMetadata.durationMillis из Drive,
+    иначе default_minutes.
+    """
+    duration_millis = (file_info.get('videoMediaMetadata') or {}).get('durationMillis')
+    if duration_millis:
+        try:
+            return int(duration_millis) / 60000
+        except (TypeError, ValueError):
+            pass
+    return default_minutes
+
+
+class JobScheduler:
+    """
+    Общая очередь новых файлов всех маппингов со справедливым разделением.
+
+    Порядок выдачи (next_job):
+        1. Файл, ждущий дольше max_wait_seconds (самый старый), - ограничивает хвост ожидания.
+        2. Маппинги с наибольшим priority (колонка таблицы маппинга).
+        3. Внутри уровня приоритета - справедливая очередь по времени начала (start-time
+           fair queueing) по маппингам: стоимость файла - его длительность в минутах,
+           деленная на weight маппинга; выбирается маппинг с наименьшим виртуальным
+           временем начала его самого короткого файла (при равенстве - файл, поставленный
+           в очередь раньше). Маппинг, который долго не присылал файлов, начинает с текущего
+           виртуального времени и проходит вперед маппинга с 30 файлами в очереди;
+           внутри маппинга короткие записи проходят вперед длинных.
+
+    Ведет метрики по маппингам: ожидание в очереди и время от постановки в очередь до саммари.
+    """
+
+    def __init__(self, max_wait_seconds=3600, default_job_minutes=30, metrics_window=500):
+        self.max_wait_seconds = max_wait_seconds
+        self.default_job_minutes = default_job_minutes
+        self._queues = {}        # ключ маппинга -> список ожидающих заданий
+        self._flows = {}         # ключ маппинга -> {'finish', 'weight', 'priority'}
+        self._virtual_time = 0.0
+        self._queued_ids = set()
+        self._active_ids = set()
+        self._finished_at = {}   # ID файла -> время завершения (до следующего чтения таблицы логов)
+        self._queue_waits = {}
+        self._time_to_summary = {}
+        self._dispatched = {}
+        self._metrics_window = metrics_window
+        self._available = asyncio.Event()
+
+    @staticmethod
+    def mapping_key(mapping):
+        return mapping['folder_id']
+
+    def is_known(self, file_id):
+        """Файл в очереди, в обработке или обработан, но еще может отсутствовать в прочитанной таблице логов."""
+        return file_id in self._queued_ids or file_id in self._active_ids or file_id in self._finished_at
+
+    def forget_finished(self, before):
+        """
+        Забывает файлы, обработанные до момента before. Вызывается после чтения таблицы
+        логов, начатого в before: такие файлы уже есть в таблице (или в операциях Speech).
+        """
+        self._finished_at = {file_id: finished_at for file_id, finished_at in self._finished_at.items()
+                             if finished_at >= before}
+
+    def enqueue(self, file_info, mapping):
+        """
+        Ставит новый файл в очередь.
+
+        Returns:
+            bool: False, если файл уже в очереди или обрабатывается.
+        """
+        if self.is_known(file_info['id']):
+            return False
+        key = self.mapping_key(mapping)
+        flow = self._flows.setdefault(key, {'finish': 0.0})
+        flow['weight'] = max(float(mapping.get('weight') or 1.0), 0.01)
+        flow['priority'] = int(mapping.get('priority') or 0)
+        job = {
+            'file_info': file_info,
+            'mapping': mapping,
+            'key': key,
+            'estimated_minutes': estimate_file_minutes(file_info, self.default_job_minutes),
+            'enqueued_at': time.time(),
+        }
+        self._queues.setdefault(key, []).append(job)
+        self._queued_ids.add(file_info['id'])
+        self._available.set()
+        return True
+
+    def queued_count(self):
+        return len(self._queued_ids)
+
+    def _head(self, key):
+        # Внутри маппинга - сначала самый короткий файл
+        return min(self._queues[key], key=lambda job: (job['estimated_minutes'], job['enqueued_at']))
+
+    def _finish_tag(self, key, job):
+        flow = self._flows[key]
+        start = max(flow['finish'], self._virtual_time)
+        return start, start + max(job['estimated_minutes'], 1.0) / flow['weight']
+
+    def next_job(self):
+        """Возвращает следующее задание (и помечает его как выполняемое) или None."""
+        active_keys = [key for key, jobs in self._queues.items() if jobs]
+        if not active_keys:
+            return None
+
+        now = time.time()
+        overdue = [job for key in active_keys for job in self._queues[key]
+                   if now - job['enqueued_at'] > self.max_wait_seconds]
+        if overdue:
+            job = min(overdue, key=lambda j: j['enqueued_at'])
+            start, finish = self._finish_tag(job['key'], job)
+        else:
+            top_priority = max(self._flows[key]['priority'] for key in active_keys)
+            best = None
+            for key in active_keys:
+                if self._flows[key]['priority'] != top_priority:
+                    continue
+                head = self._head(key)
+                start, finish = self._finish_tag(key, head)
+                if best is None or (start, head['enqueued_at']) < (best[1], best[0]['enqueued_at']):
+                    best = (head, start, finish)
+            job, start, finish = best
+
+        key = job['key']
+        self._flows[key]['finish'] = finish
+        self._virtual_time = max(self._virtual_time, start)
+        self._queues[key].remove(job)
+        self._queued_ids.discard(job['file_info']['id'])
+        self._active_ids.add(job['file_info']['id'])
+
+        wait = now - job['enqueued_at']
+        job['queue_wait_seconds'] = wait
+        self._queue_waits.setdefault(key, deque(maxlen=self._metrics_window)).append(wait)
+        self._dispatched[key] = self._dispatched.get(key, 0) + 1
+        return job
+
+    async def get(self):
+        """Ждет и возвращает следующее задание."""
+        while True:
+            job = self.next_job()
+            if job is not None:
+                return job
+            self._available.clear()
+            await self._available.wait()
+
+    def done(self, job):
+        """Файл обработан (или распознавание запущено) - освобождает место в очереди."""
+        file_id = job['file_info']['id']
+        self._active_ids.discard(file_id)
+        self._finished_at[file_id] = time.time()
+
+    def record_time_to_summary(self, key, enqueued_at):
+        """Учитывает время от постановки файла в очередь до отправки саммари."""
+        if key is None or enqueued_at is None:
+            return
+        self._time_to_summary.setdefault(key, deque(maxlen=self._metrics_window)).append(time.time() - enqueued_at)
+
+    def metrics(self):
+        """
+        Метрики по маппингам (секунды, по последним metrics_window файлам).
+
+        Returns:
+            dict: {ключ маппинга: {'queued', 'dispatched', 'queue_wait_p50', 'queue_wait_p95',
+                   'queue_wait_max', 'time_to_summary_p50', 'time_to_summary_p95'}}
+        """
+        result = {}
+        for key in set(self._queues) | set(self._queue_waits) | set(self._time_to_summary):
+            waits = list(self._queue_waits.get(key, ()))
+            summaries = list(self._time_to_summary.get(key, ()))
+            result[key] = {
+                'queued': len(self._queues.get(key, ())),
+                'dispatched': self._dispatched.get(key, 0),
+                'queue_wait_p50': _percentile(waits, 50),
+                'queue_wait_p95': _percentile(waits, 95),
+                'queue_wait_max': max(waits) if waits else None,
+                'time_to_summary_p50': _percentile(summaries, 50),
+                'time_to_summary_p95': _percentile(summaries, 95),
+            }
+        return result
@@ -3,48 +3,329 @@ import config as conf
 import logging
 import asyncio
 import voicy_functions as voicy
+import voicy_logging
+import transcription_backends
+import transcript_store
+import speech_operations
+import job_scheduler
+from drive_download import DownloadError
 from telegram import Bot
 import time # Для возможной задержки между обработкой папок
 
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 logger = logging.getLogger(__name__)
 
-# Инициализация бота и сервисов Google
-try:
-    bot = Bot(token=conf.TELEGRAM_API_TOKEN)
-    drive_service, sheets_service, docs_service, speech_client, storage_client, gc = voicy.authenticate(
-        conf.SERVICE_ACCOUNT_FILE, conf.SCOPES)
-    logger.info("Аутентификация и инициализация сервисов Google прошла успешно.")
-except Exception as auth_error:
-    logger.critical(f"Критическая ошибка при аутентификации или инициализации сервисов: {auth_error}")
-    # Здесь можно завершить работу скрипта, если аутентификация не удалась
-    exit() # Или использовать sys.exit()
-
 media_mime_types = conf.media_mime_types
 
+# Сервисы создаются в init_services() только при запуске main.py как скрипта:
+# процессы пула локальной транскрибации (spawn) импортируют этот модуль заново
+# и не должны повторно аутентифицироваться и открывать хранилища.
+bot = None
+drive_service = sheets_service = docs_service = speech_client = storage_client = gc = None
+transcripts = None
+operation_manager = None
+
+
+def init_services():
+    """Настраивает логирование и инициализирует бота, сервисы Google, хранилище транскриптов и операции Speech."""
+    global bot, drive_service, sheets_service, docs_service, speech_client, storage_client, gc
+    global transcripts, operation_manager
+
+    voicy_logging.setup_logging(
+        level=getattr(conf, 'LOG_LEVEL', 'INFO'),
+        module_levels=getattr(conf, 'LOG_MODULE_LEVELS', None),
+        json_output=getattr(conf, 'LOG_JSON', True),
+        sample_every=getattr(conf, 'LOG_SAMPLE_EVERY', 100),
+    )
+
+    # Инициализация бота и сервисов Google
+    try:
+        bot = Bot(token=conf.TELEGRAM_API_TOKEN)
+        drive_service, sheets_service, docs_service, speech_client, storage_client, gc = voicy.authenticate(
+            conf.SERVICE_ACCOUNT_FILE, conf.SCOPES)
+        logger.info("Аутентификация и инициализация сервисов Google прошла успешно.")
+    except Exception as auth_error:
+        logger.critical("Критическая ошибка при аутентификации или инициализации сервисов: %s", auth_error)
+        # Здесь можно завершить работу скрипта, если аутентификация не удалась
+        exit() # Или использовать sys.exit()
+
+    # Полные транскрипты хранятся вне таблицы логов (в таблице - отрывок и ссылка)
+    try:
+        transcripts = transcript_store.open_transcript_store(getattr(conf, 'TRANSCRIPT_STORE_URI', 'transcripts'), storage_client)
+    except Exception as store_error:
+        logger.error("Не удалось открыть хранилище транскриптов: %s. Транскрипты будут записываться в таблицу.", store_error)
+        transcripts = None
+
+    # Операции Speech-to-Text опрашиваются в одном цикле и переживают перезапуск сервиса
+    operation_manager = speech_operations.SpeechOperationManager(
+        speech_client, storage_client, conf.CLOUD_STORAGE_BUCKET_NAME,
+        state_path=getattr(conf, 'SPEECH_OPERATIONS_STATE_FILE', 'speech_operations.json'),
+        on_done=on_transcription_done,
+        min_poll_interval=getattr(conf, 'SPEECH_POLL_MIN_SECONDS', 15),
+        max_poll_interval=getattr(conf, 'SPEECH_POLL_MAX_SECONDS', 300),
+        max_operation_hours=getattr(conf, 'SPEECH_OPERATION_MAX_HOURS', 24),
+        max_poll_failures=getattr(conf, 'SPEECH_POLL_MAX_FAILURES', 10),
+    )
+
+
+# Профиль транскрибации по умолчанию (колонки таблицы маппинга переопределяют его для конкретной папки)
+default_transcription_profile = voicy.build_transcription_profile(defaults={
+    'language_code': getattr(conf, 'SPEECH_LANGUAGE_CODE', None),
+    'alternative_language_codes': getattr(conf, 'SPEECH_ALTERNATIVE_LANGUAGE_CODES', None),
+    'model': getattr(conf, 'SPEECH_MODEL', None),
+    'short_model': getattr(conf, 'SPEECH_SHORT_MODEL', None),
+    'short_audio_max_minutes': getattr(conf, 'SPEECH_SHORT_AUDIO_MAX_MINUTES', None),
+    'channel_mode': getattr(conf, 'SPEECH_CHANNEL_MODE', None),
+    'min_speakers': getattr(conf, 'SPEECH_MIN_SPEAKERS', None),
+    'max_speakers': getattr(conf, 'SPEECH_MAX_SPEAKERS', None),
+    'backend': getattr(conf, 'TRANSCRIPTION_BACKEND', None),
+})
+
+# Движки транскрибации создаются при первом использовании и переиспользуются между файлами
+transcription_backend_instances = {}
+
+def get_transcription_backend(name):
+    """Возвращает движок транскрибации по имени; при ошибке - движок Google по умолчанию."""
+    if name not in transcription_backend_instances:
+        try:
+            transcription_backend_instances[name] = transcription_backends.create_transcription_backend(name, conf)
+        except (ValueError, RuntimeError) as backend_error:
+            logger.error("Не удалось создать движок транскрибации '%s': %s. Используется Google Speech-to-Text.", name, backend_error)
+            # Запоминаем замену, чтобы не повторять попытку (и ошибку в логе) для каждого файла
+            transcription_backend_instances[name] = get_transcription_backend(transcription_backends.GoogleSpeechBackend.name)
+    return transcription_backend_instances[name]
+
+# Общая очередь новых файлов всех маппингов (справедливая очередность, короткие записи - вперед)
+scheduler = job_scheduler.JobScheduler(
+    max_wait_seconds=getattr(conf, 'SCHEDULER_MAX_WAIT_MINUTES', 60) * 60,
+    default_job_minutes=getattr(conf, 'SCHEDULER_DEFAULT_JOB_MINUTES', 30),
+)
+
+
+async def finalize_meeting(meeting, transcribed_text, duration_minutes, transcript_words=None, processing_error=None):
+    """
+    Завершает обработку встречи после транскрибации: саммаризация, отправка в Telegram,
+    сохранение транскрипта и запись в основную таблицу.
+
+    Вызывается и для синхронных движков, и из SpeechOperationManager по завершении операции.
+    Если передан processing_error (ошибка скачивания/конвертации/запуска или voicy.TranscriptionError),
+    в чат уходит сообщение об ошибке, транскрипт не сохраняется в хранилище, а файл все равно
+    записывается в таблицу, чтобы не обрабатывать его повторно.
+    """
+    file_audio_id = meeting['file_id']
+    file_audio_name = meeting['file_name']
+    current_chat_id = meeting['chat_id']
+    current_email = meeting.get('email', 'N/A')
+
+    model_answer = None
+    input_tokens = 0
+    output_tokens = 0
+
+    try:
+        if processing_error is not None:
+            raise processing_error
+        if transcribed_text is None:
+             raise ValueError("Ошибка транскрипции, получено None.") # Генерируем ошибку для блока except
+        logger.info("Транскрипция %s завершена. Длительность: %.2f мин.", file_audio_name, duration_minutes)
+
+        logger.info("Чтение промпта из Google Doc ID: %s", conf.DOCUMENT_PROMPT_ID)
+        prompt = await asyncio.to_thread(voicy.read_google_doc, docs_service, conf.DOCUMENT_PROMPT_ID)
+        if prompt is None:
+            logger.error("Не удалось прочитать документ с промптом. Пропуск саммаризации.")
+            # Можно либо пропустить саммаризацию, либо прервать обработку файла
+            model_answer = "Ошибка: Не удалось загрузить промпт для саммаризации."
+        else:
+            logger.info("Саммаризация текста...")
+            # Указываем модель явно или берем из конфига
+            openai_model = conf.OPENAI_MODEL if hasattr(conf, 'OPENAI_MODEL') else "gpt-3.5-turbo"
+            summary_result = await asyncio.to_thread(voicy.openai_summarizer, conf.openai_api_key,
+                                                     transcribed_text, prompt, openai_model)
+            if summary_result:
+                model_answer, input_tokens, output_tokens = summary_result
+                logger.info("Саммаризация завершена. Токены: In=%s, Out=%s", input_tokens, output_tokens)
+            else:
+                logger.error("Ошибка при саммаризации текста.")
+                model_answer = "Ошибка: Не удалось выполнить саммаризацию."
+
+        logger.info("Отправка саммари в Telegram чат ID: %s...", current_chat_id)
+        await bot.send_message(chat_id=current_chat_id, text=model_answer)
+        logger.info("Саммари отправлено.")
+
+    except Exception as file_proc_error:
+        logger.error("Ошибка при обработке файла %s (ID: %s): %s", file_audio_name, file_audio_id, file_proc_error)
+        # Попытка отправить сообщение об ошибке в чат
+        try:
+            error_message = f"Не удалось обработать файл: {file_audio_name}\nОшибка: {file_proc_error}"
+            await bot.send_message(chat_id=current_chat_id, text=error_message)
+        except Exception as telegram_error:
+             logger.error("Не удалось отправить сообщение об ошибке в Telegram чат %s: %s", current_chat_id, telegram_error)
+
+    finally:
+        # --- Запись в основную таблицу ВНЕ зависимости от успеха саммаризации, если была транскрипция ---
+        # Записываем, даже если была ошибка, чтобы не обрабатывать повторно
+        transcript_pointer = None
+        # Сообщения об ошибке транскрибации в хранилище не попадают
+        if transcripts is not None and processing_error is None and transcribed_text:
+            try:
+                transcript_pointer = await asyncio.to_thread(
+                    transcripts.put, file_audio_id, transcribed_text, transcript_words,
+                    {'meeting_name': file_audio_name, 'speech_minutes': duration_minutes,
+                     'source_identifier': current_email}
+                )
+            except Exception as store_error:
+                logger.error("Не удалось сохранить транскрипт %s в хранилище: %s", file_audio_id, store_error)
+        await asyncio.to_thread(
+            voicy.write_to_google_sheet,
+            gc=gc,
+            spreadsheet_id=conf.SPREADSHEET_ID, # Имя основной таблицы из конфига
+            meeting_id=file_audio_id,
+            meeting_name=file_audio_name,
+            transcribation_text=transcribed_text if transcribed_text else "Ошибка транскрипции",
+            summary=model_answer if model_answer else "Ошибка саммаризации",
+            speech_minutes=duration_minutes,
+            input_openai=input_tokens,
+            output_openai=output_tokens,
+            source_identifier=current_email, # Передаем идентификатор сотрудника
+            transcript_pointer=transcript_pointer,
+            excerpt_chars=getattr(conf, 'TRANSCRIPT_EXCERPT_CHARS', 500)
+        )
+        scheduler.record_time_to_summary(meeting.get('queue_key'), meeting.get('enqueued_at'))
+
+
+async def process_new_file(file_info, mapping, enqueued_at=None):
+    """
+    Скачивает и конвертирует новый файл, затем транскрибирует его.
+
+    Длинные записи для Google Speech-to-Text только запускаются в SpeechOperationManager
+    (результат придет в finalize_meeting из цикла опроса операций); короткие записи и
+    локальный движок обрабатываются сразу.
+
+    Все записи лога по файлу (включая опрос операции и саммаризацию) помечаются
+    meeting_id и одним trace_id.
+    """
+    with voicy_logging.trace_context(file_info['id']) as trace_id:
+        meeting = {
+            'file_id': file_info['id'],
+            'file_name': file_info['name'],
+            'folder_id': mapping['folder_id'],
+            'chat_id': mapping['chat_id'],
+            'email': mapping.get('email', 'N/A'),
+            'trace_id': trace_id,
+            'queue_key': job_scheduler.JobScheduler.mapping_key(mapping),
+            'enqueued_at': enqueued_at,
+        }
+        await _process_meeting_file(meeting, mapping.get('profile', default_transcription_profile))
+
+
+async def _process_meeting_file(meeting, current_profile):
+    file_audio_id = meeting['file_id']
+    file_audio_name = meeting['file_name']
+    logger.info("Обработка файла: %s (ID: %s) из папки %s", file_audio_name, file_audio_id, meeting['folder_id'])
+
+    # Генерируем уникальные пути для временных файлов, чтобы избежать конфликтов.
+    # Путь скачивания постоянный для файла: после перезапуска сервиса скачивание продолжится с места остановки
+    temp_id = f"{file_audio_id}_{int(time.time())}"
+    downloaded_file_path = os.path.join(conf.TEMP_FOLDER_PATH, f"{file_audio_id}_downloaded.mp4")
+    audio_file_path = os.path.join(conf.TEMP_FOLDER_PATH, f"{temp_id}_converted.wav")
+
+    transcribed_text = None
+    transcript_words = []
+    duration_minutes = 0.0
+    keep_download = False
+
+    try:
+        # --- Шаги обработки файла ---
+        logger.info("Скачивание файла %s...", file_audio_name)
+        if not await asyncio.to_thread(voicy.download_file_from_google_drive,
+                                       file_audio_id, downloaded_file_path, conf.SERVICE_ACCOUNT_FILE,
+                                       connections=getattr(conf, 'DRIVE_DOWNLOAD_CONNECTIONS', 4),
+                                       chunk_size=getattr(conf, 'DRIVE_DOWNLOAD_CHUNK_MB', 8) * 1024 * 1024):
+            raise RuntimeError("Не удалось скачать файл с Google Drive.")
+        logger.info("Файл %s скачан.", file_audio_name)
+
+        logger.info("Конвертация %s в WAV...", file_audio_name)
+        if not await asyncio.to_thread(voicy.convert_mp4_to_wav, downloaded_file_path, audio_file_path,
+                                       voicy.channel_count_for_profile(current_profile)):
+            raise RuntimeError("Не удалось сконвертировать файл в WAV.")
+        duration_minutes = await asyncio.to_thread(voicy.get_audio_duration_minutes, audio_file_path)
+        logger.info("Файл %s сконвертирован.", file_audio_name)
+
+        backend = get_transcription_backend(current_profile.get('backend'))
+        model = voicy.select_speech_model(current_profile, duration_minutes)
+        if (backend.name == transcription_backends.GoogleSpeechBackend.name
+                and not voicy.use_sync_recognize(duration_minutes)):
+            logger.info("Запуск транскрипции %s (модель %s) без ожидания результата...", file_audio_name, model)
+            await operation_manager.submit(meeting, audio_file_path, current_profile, model, duration_minutes)
+            return
+
+        logger.info("Транскрипция %s (движок %s)...", file_audio_name, backend.name)
+        # Получаем и текст, и длительность (модель выбирается по длительности и профилю маппинга)
+        transcribed_text, duration_minutes = await asyncio.to_thread(
+            backend.transcribe, audio_file_path, current_profile,
+            duration_minutes=duration_minutes, words_out=transcript_words
+        )
+    except voicy.TranscriptionError as transcription_error:
+        # В таблицу записывается сообщение об ошибке вместо транскрипта, в чат - сообщение об ошибке
+        await finalize_meeting(meeting, str(transcription_error), duration_minutes, processing_error=transcription_error)
+        return
+    except DownloadError as download_error:
+        # Файл не записывается в таблицу: следующая проверка папок снова поставит его
+        # в очередь, и скачивание продолжится с места остановки
+        logger.warning("Скачивание %s прервано (%s), докачка при следующей проверке папок.", file_audio_name, download_error)
+        keep_download = True
+        return
+    except Exception as file_proc_error:
+        await finalize_meeting(meeting, None, duration_minutes, processing_error=file_proc_error)
+        return
+    finally:
+        # --- Очистка временных файлов ---
+        logger.info("Очистка временных файлов для %s...", file_audio_id)
+        for f_path in ([audio_file_path] if keep_download else [downloaded_file_path, audio_file_path]):
+             if os.path.exists(f_path):
+                 try:
+                     os.remove(f_path)
+                     logger.info("Удален временный файл: %s", f_path)
+                 except OSError as remove_error:
+                     logger.error("Не удалось удалить временный файл %s: %s", f_path, remove_error)
+
+    await finalize_meeting(meeting, transcribed_text, duration_minutes, transcript_words)
+
+
+async def on_transcription_done(meeting, transcribed_text, duration_minutes, transcript_words, failed):
+    """Получает результат операции Speech-to-Text из цикла опроса и завершает обработку встречи."""
+    processing_error = voicy.TranscriptionError(transcribed_text) if failed else None
+    await finalize_meeting(meeting, transcribed_text, duration_minutes, transcript_words, processing_error=processing_error)
+
+
 async def check_and_process_all_mappings():
     """
-    Асинхронно проверяет папки Google Drive согласно маппингу, обрабатывает новые файлы
-    и отправляет результаты в соответствующие Telegram чаты.
+    Асинхронно проверяет папки Google Drive согласно маппингу и ставит новые файлы
+    в общую очередь (scheduler). Файлы обрабатывают processing_worker, результаты
+    отправляются в соответствующие Telegram чаты.
     """
     start_time = time.time()
     logger.info("Начало цикла проверки папок по маппингу...")
 
     try:
+        # Операции, идущие до чтения таблицы: операция, завершившаяся во время чтения или
+        # позже, уже удалена из pending_meeting_ids(), но может не попасть в прочитанную таблицу
+        pending_before_read = operation_manager.pending_meeting_ids()
         # 1. Получаем список всех уже обработанных файлов ОДИН РАЗ за цикл
-        processed_media_ids = voicy.get_first_column_values(gc, conf.SPREADSHEET_ID)
+        processed_media_ids = await asyncio.to_thread(voicy.get_first_column_values, gc, conf.SPREADSHEET_ID)
         if processed_media_ids is None:
             logger.error("Не удалось получить список обработанных ID из основной таблицы. Пропуск цикла.")
             return # Выходим, если не можем получить ID
+        processed_media_ids = set(processed_media_ids)
+        # Файлы, обработанные до начала чтения таблицы, уже в ней - очереди их помнить не нужно
+        scheduler.forget_finished(start_time)
 
         # 2. Получаем все маппинги "папка-чат"
-        mapping_entries = voicy.read_mapping_sheet(gc, conf.MAPPING_SPREADSHEET_ID) # Используем имя из конфига
+        mapping_entries = await asyncio.to_thread(voicy.read_mapping_sheet, gc, conf.MAPPING_SPREADSHEET_ID, # Используем имя из конфига
+                                                  default_profile=default_transcription_profile)
         if not mapping_entries:
             logger.warning("Таблица маппинга пуста или не найдена. Нет папок для проверки.")
             return
 
-        print(mapping_entries)
+        logger.debug("Записи маппинга: %s", mapping_entries)
 
         # 3. Итерируемся по каждому маппингу
         for mapping in mapping_entries:
@@ -52,157 +333,65 @@ async def check_and_process_all_mappings():
             current_chat_id = mapping['chat_id']
             current_email = mapping.get('email', 'N/A') # Получаем email для логирования
 
-            logger.info(f"--- Обработка маппинга для папки: {current_folder_id} (Email: {current_email}, ChatID: {current_chat_id}) ---")
+            logger.info("--- Обработка маппинга для папки: %s (Email: %s, ChatID: %s) ---", current_folder_id, current_email, current_chat_id)
 
             try:
                 # 4. Ищем медиафайлы в ТЕКУЩЕЙ папке
-                media_in_folder = voicy.find_media_files_on_drive(drive_service, current_folder_id, media_mime_types=media_mime_types)
+                media_in_folder = await asyncio.to_thread(voicy.find_media_files_on_drive, drive_service, current_folder_id,
+                                                          media_mime_types=media_mime_types)
 
                 if media_in_folder is None:
-                    logger.warning(f"Произошла ошибка при поиске файлов в папке {current_folder_id}, переход к следующему маппингу.")
+                    logger.warning("Произошла ошибка при поиске файлов в папке %s, переход к следующему маппингу.", current_folder_id)
                     continue # Переходим к следующему маппингу
 
                 if not media_in_folder:
-                    logger.info(f"В папке {current_folder_id} нет медиафайлов нужных типов.")
+                    logger.info("В папке %s нет медиафайлов нужных типов.", current_folder_id)
                     continue # Переходим к следующему маппингу
 
-                # 5. Находим НОВЫЕ файлы для этой папки (сравниваем с ОБЩИМ списком обработанных)
-                new_files_for_folder = voicy.find_new_media_files(media_in_folder, processed_media_ids)
+                # 5. Находим НОВЫЕ файлы для этой папки (сравниваем с ОБЩИМ списком обработанных,
+                #    с очередью и с файлами, распознавание которых еще идет)
+                pending_ids = pending_before_read | operation_manager.pending_meeting_ids()
+                new_files_for_folder = [file_info for file_info in voicy.find_new_media_files(media_in_folder, processed_media_ids)
+                                        if file_info['id'] not in pending_ids and not scheduler.is_known(file_info['id'])]
 
                 if not new_files_for_folder:
-                    logger.info(f"Нет новых медиафайлов для обработки в папке {current_folder_id}.")
+                    logger.info("Нет новых медиафайлов для обработки в папке %s.", current_folder_id)
                     continue # Переходим к следующему маппингу
 
-                logger.info(f"Найдено {len(new_files_for_folder)} новых файлов в папке {current_folder_id}. Начинаю обработку...")
-
-                # 6. Обрабатываем КАЖДЫЙ новый файл в этой папке
-                for file_info in new_files_for_folder:
-                    file_audio_id = file_info['id']
-                    file_audio_name = file_info['name']
-                    logger.info(f"Обработка файла: {file_audio_name} (ID: {file_audio_id}) из папки {current_folder_id}")
-
-                    # Генерируем уникальные пути для временных файлов, чтобы избежать конфликтов
-                    # Можно добавить ID файла или timestamp к имени
-                    temp_id = f"{file_audio_id}_{int(time.time())}"
-                    downloaded_file_path = os.path.join(conf.TEMP_FOLDER_PATH, f"{temp_id}_downloaded.mp4") # Предполагаем наличие TEMP_FOLDER_PATH в config.py
-                    audio_file_path = os.path.join(conf.TEMP_FOLDER_PATH, f"{temp_id}_converted.wav")
-
-                    transcribed_text = None
-                    duration_minutes = 0.0
-                    model_answer = None
-                    input_tokens = 0
-                    output_tokens = 0
-                    processed_successfully = False
-
-                    try:
-                        # --- Шаги обработки файла ---
-                        logger.info(f"Скачивание файла {file_audio_name}...")
-                        voicy.download_file_from_google_drive(file_audio_id, downloaded_file_path, conf.SERVICE_ACCOUNT_FILE)
-                        logger.info(f"Файл {file_audio_name} скачан.")
-
-                        logger.info(f"Конвертация {file_audio_name} в WAV...")
-                        voicy.convert_mp4_to_wav(downloaded_file_path, audio_file_path)
-                        logger.info(f"Файл {file_audio_name} сконвертирован.")
-
-                        logger.info(f"Транскрипция {file_audio_name}...")
-                        # Получаем и текст, и длительность
-                        transcribed_text, duration_minutes = voicy.transcribe_audio_file(
-                            conf.CLOUD_STORAGE_BUCKET_NAME, audio_file_path, conf.SERVICE_ACCOUNT_FILE
-                        )
-
-                        if transcribed_text is None:
-                             raise ValueError("Ошибка транскрипции, получено None.") # Генерируем ошибку для блока except
-                        logger.info(f"Транскрипция завершена. Длительность: {duration_minutes:.2f} мин.")
-
-
-                        logger.info(f"Чтение промпта из Google Doc ID: {conf.DOCUMENT_PROMPT_ID}")
-                        prompt = voicy.read_google_doc(docs_service, conf.DOCUMENT_PROMPT_ID)
-                        if prompt is None:
-                            logger.error("Не удалось прочитать документ с промптом. Пропуск саммаризации.")
-                            # Можно либо пропустить саммаризацию, либо прервать обработку файла
-                            model_answer = "Ошибка: Не удалось загрузить промпт для саммаризации."
-                        else:
-                            logger.info("Саммаризация текста...")
-                            # Указываем модель явно или берем из конфига
-                            openai_model = conf.OPENAI_MODEL if hasattr(conf, 'OPENAI_MODEL') else "gpt-3.5-turbo"
-                            summary_result = voicy.openai_summarizer(conf.openai_api_key,
-                                                                        transcribed_text, prompt, openai_model)
-                            if summary_result:
-                                model_answer, input_tokens, output_tokens = summary_result
-                                logger.info(f"Саммаризация завершена. Токены: In={input_tokens}, Out={output_tokens}")
-                            else:
-                                logger.error("Ошибка при саммаризации текста.")
-                                model_answer = "Ошибка: Не удалось выполнить саммаризацию."
-
-
-                        logger.info(f"Отправка саммари в Telegram чат ID: {current_chat_id}...")
-                        await bot.send_message(chat_id=current_chat_id, text=model_answer)
-                        logger.info("Саммари отправлено.")
-
-                        processed_successfully = True
-
-                    except Exception as file_proc_error:
-                        logger.error(f"Ошибка при обработке файла {file_audio_name} (ID: {file_audio_id}): {file_proc_error}")
-                        # Попытка отправить сообщение об ошибке в чат
-                        try:
-                            error_message = f"Не удалось обработать файл: {file_audio_name}\nОшибка: {file_proc_error}"
-                            await bot.send_message(chat_id=current_chat_id, text=error_message)
-                        except Exception as telegram_error:
-                             logger.error(f"Не удалось отправить сообщение об ошибке в Telegram чат {current_chat_id}: {telegram_error}")
-
-                    finally:
-                        # --- Запись в основную таблицу ВНЕ зависимости от успеха саммаризации, если была транскрипция ---
-                        # Записываем, даже если была ошибка, чтобы не обрабатывать повторно
-                        # Но записываем только если есть ID файла
-                        if file_audio_id:
-                             # Используем source_identifier для указания папки
-                            source_id = f"Folder: {current_folder_id}"
-                            voicy.write_to_google_sheet(
-                                gc=gc,
-                                spreadsheet_id=conf.SPREADSHEET_ID, # Имя основной таблицы из конфига
-                                meeting_id=file_audio_id,
-                                meeting_name=file_audio_name,
-                                transcribation_text=transcribed_text if transcribed_text else "Ошибка транскрипции",
-                                summary=model_answer if model_answer else "Ошибка саммаризации",
-                                speech_minutes=duration_minutes,
-                                input_openai=input_tokens,
-                                output_openai=output_tokens,
-                                source_identifier=current_email # Передаем идентификатор сотрудника
-                            )
-                            # Важно: Добавляем ID в список обработанных *сразу после записи*
-                            # чтобы следующий файл в этом же цикле не считался новым, если он был найден ранее
-                            if processed_media_ids is not None:
-                                processed_media_ids.append(file_audio_id)
-                        else:
-                            logger.warning("Не удалось записать результат в таблицу: отсутствует file_audio_id.")
-
-
-                        # --- Очистка временных файлов ---
-                        logger.info(f"Очистка временных файлов для {file_audio_id}...")
-                        for f_path in [downloaded_file_path, audio_file_path]:
-                             if os.path.exists(f_path):
-                                 try:
-                                     os.remove(f_path)
-                                     logger.info(f"Удален временный файл: {f_path}")
-                                 except OSError as remove_error:
-                                     logger.error(f"Не удалось удалить временный файл {f_path}: {remove_error}")
-
-                    # Небольшая пауза между обработкой файлов, если нужно
-                    # await asyncio.sleep(5)
+                # 6. Ставим новые файлы в общую очередь (обработка - в processing_worker)
+                enqueued = sum(scheduler.enqueue(file_info, mapping) for file_info in new_files_for_folder)
+                logger.info("Найдено %s новых файлов в папке %s, поставлено в очередь: %s.", len(new_files_for_folder), current_folder_id, enqueued)
 
             except Exception as mapping_proc_error:
-                logger.error(f"Непредвиденная ошибка при обработке маппинга для папки {current_folder_id}: {mapping_proc_error}")
+                logger.error("Непредвиденная ошибка при обработке маппинга для папки %s: %s", current_folder_id, mapping_proc_error)
                 # Продолжаем со следующим маппингом
 
-            logger.info(f"--- Завершение обработки маппинга для папки: {current_folder_id} ---")
+            logger.info("--- Завершение обработки маппинга для папки: %s ---", current_folder_id)
             # Можно добавить небольшую паузу между проверкой разных папок
             # await asyncio.sleep(10)
 
     except Exception as e:
-        logger.error(f"Критическая ошибка в главном цикле `check_and_process_all_mappings`: {e}", exc_info=True) # Добавляем traceback
+        logger.error("Критическая ошибка в главном цикле `check_and_process_all_mappings`: %s", e, exc_info=True) # Добавляем traceback
     finally:
         end_time = time.time()
-        logger.info(f"Цикл проверки завершен за {end_time - start_time:.2f} секунд.")
+        logger.info("Цикл проверки завершен за %.2f секунд. В очереди файлов: %s.", end_time - start_time, scheduler.queued_count())
+        logger.info("Метрики очереди по маппингам", extra={'queue_metrics': scheduler.metrics()})
+
+
+async def processing_worker(worker_number):
+    """Берет файлы из общей очереди и обрабатывает их по одному."""
+    while True:
+        job = await scheduler.get()
+        file_info = job['file_info']
+        logger.info("Обработчик %s: файл %s (ID: %s) из папки %s, ожидание в очереди %.0f с, оценка длительности %.1f мин.",
+                    worker_number, file_info['name'], file_info['id'], job['key'],
+                    job['queue_wait_seconds'], job['estimated_minutes'])
+        try:
+            await process_new_file(file_info, job['mapping'], job['enqueued_at'])
+        except Exception as worker_error:
+            logger.error("Непредвиденная ошибка при обработке файла %s: %s", file_info['id'], worker_error, exc_info=True)
+        finally:
+            scheduler.done(job)
 
 
 async def main():
@@ -213,8 +402,16 @@ async def main():
         logger.warning("Переменная TEMP_FOLDER_PATH не задана в config.py. Временные файлы будут создаваться в текущей директории.")
         conf.TEMP_FOLDER_PATH = "." # Используем текущую директорию
 
+    # Цикл опроса операций Speech-to-Text и обработчики очереди работают параллельно с проверкой папок
+    operations_task = asyncio.create_task(operation_manager.run())
+    worker_tasks = [asyncio.create_task(processing_worker(number))
+                    for number in range(1, getattr(conf, 'SCHEDULER_WORKERS', 2) + 1)]
+
     logger.info("Бот запущен и проверяет папки каждые 30 минут...")
     while True:
+        if operations_task.done():
+            logger.error("Цикл опроса операций транскрипции остановился (%r), перезапуск.", operations_task.exception())
+            operations_task = asyncio.create_task(operation_manager.run())
         await check_and_process_all_mappings() # Вызываем обновленную функцию
         logger.info("Ожидание следующего цикла проверки (10 минут)...")
         await asyncio.sleep(600)  # Проверяем каждые 10 минут!!!
@@ -222,4 +419,5 @@ async def main():
 
 
 if __name__ == '__main__':
+    init_services()
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import tempfile
+
+from google.cloud import speech_v1 as speech
+
+import voicy_functions as voicy
+from voicy_logging import trace_context
+
+
+logger = logging.getLogger(__name__)
+
+
+class SpeechOperationManager:
+    """
+    Мультиплексор операций long_running_recognize: много запусков, один цикл опроса.
+
+    submit() загружает аудио в Cloud Storage, запускает распознавание и сохраняет имя
+    операции в файл состояния, не дожидаясь результата. run() в одном asyncio-цикле
+    опрашивает все незавершенные операции с адаптивным интервалом (по progress_percent
+    из метаданных операции) и по завершении передает результат в on_done:
+
+        await on_done(meeting, dialogue_text, duration_minutes, transcript_words, failed)
+
+    failed=True означает, что текста встречи нет: dialogue_text - сообщение об ошибке.
+
+    on_done выполняется отдельной задачей и не задерживает опрос остальных операций;
+    операция удаляется из файла состояния, когда on_done завершится. Операция, которую
+    не удается опросить max_poll_failures раз подряд или дольше max_operation_hours,
+    завершается с текстом ошибки.
+
+    После перезапуска операции из файла состояния продолжают опрашиваться
+    (повторного запуска и оплаты распознавания нет).
+    """
+
+    def __init__(self, speech_client, storage_client, bucket_name, state_path, on_done,
+                 min_poll_interval=15, max_poll_interval=300, max_operation_hours=24, max_concurrent_polls=8,
+                 max_poll_failures=10):
+        self.speech_client = speech_client
+        self.storage_client = storage_client
+        self.bucket_name = bucket_name
+        self.state_path = state_path
+        self.on_done = on_done
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_operation_seconds = max_operation_hours * 3600
+        self.max_concurrent_polls = max_concurrent_polls
+        self.max_poll_failures = max_poll_failures
+        self.operations = self._load_state()
+        self._wakeup = asyncio.Event()
+        self._handoff_tasks = set()
+
+    # --- Файл состояния ---
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                operations = json.load(f).get('operations', {})
+            # Результат, обработка которого прервалась перезапуском, будет получен повторно
+            for entry in operations.values():
+                entry.pop('finishing', None)
+            logger.info("Загружено %s незавершенных операций транскрипции из %s", len(operations), self.state_path)
+            return operations
+        except (OSError, ValueError) as e:
+            logger.error("Не удалось прочитать файл состояния операций %s: %s", self.state_path, e)
+            return {}
+
+    def _save_state(self):
+        state_dir = os.path.dirname(os.path.abspath(self.state_path))
+        fd, tmp_path = tempfile.mkstemp(dir=state_dir, prefix='.speech_operations_')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'operations': self.operations}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            logger.error("Не удалось сохранить файл состояния операций %s: %s", self.state_path, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def pending_meeting_ids(self):
+        """ID встреч (файлов Drive), распознавание которых еще идет."""
+        return {entry['meeting']['file_id'] for entry in self.operations.values()}
+
+    def _clamp_interval(self, seconds):
+        return max(self.min_poll_interval, min(self.max_poll_interval, seconds))
+
+    # --- Запуск ---
+    def _start(self, audio_path, profile, model):
+        config = voicy.build_recognition_config(profile, model)
+        operation, blob = voicy.submit_long_running_recognition(self.speech_client, self.storage_client,
+                                                                self.bucket_name, audio_path, config)
+        return operation.operation.name, blob.name
+
+    async def submit(self, meeting, audio_path, profile, model, duration_minutes):
+        """
+        Запускает распознавание файла и регистрирует операцию для опроса.
+        Локальный audio_path после возврата можно удалять.
+
+        Args:
+            meeting (dict): Сведения о встрече (file_id, file_name, chat_id, ...); передаются в on_done.
+            audio_path (str): Сконвертированный WAV.
+            profile (dict): Профиль транскрибации.
+            model (str): Модель Speech-to-Text (см. voicy.select_speech_model).
+            duration_minutes (float): Длительность записи.
+
+        Returns:
+            str: Имя операции.
+        """
+        operation_name, blob_name = await asyncio.to_thread(self._start, audio_path, profile, model)
+        now = time.time()
+        # Первый опрос - примерно через четверть длительности записи
+        interval = self._clamp_interval(duration_minutes * 60 / 4)
+        self.operations[operation_name] = {
+            'meeting': meeting,
+            'blob_name': blob_name,
+            'audio_label': os.path.basename(audio_path),
+            'duration_minutes': duration_minutes,
+            'submitted_at': now,
+            'interval': interval,
+            'next_poll_at': now + interval,
+        }
+        self._save_state()
+        self._wakeup.set()
+        logger.info("Операция транскрипции %s для %s запущена, первый опрос через %.0f с.", operation_name, meeting['file_name'], interval)
+        return operation_name
+
+    # --- Опрос ---
+    async def run(self):
+        """Бесконечный цикл опроса всех незавершенных операций."""
+        if self.operations:
+            logger.info("Продолжаю опрос %s операций транскрипции, запущенных до перезапуска.", len(self.operations))
+        while True:
+            now = time.time()
+            polled = {name: entry for name, entry in self.operations.items() if not entry.get('finishing')}
+            due = [name for name, entry in polled.items() if entry['next_poll_at'] <= now]
+            if due:
+                await self.poll(due)
+                continue
+            next_poll_at = min((entry['next_poll_at'] for entry in polled.values()),
+                               default=now + self.max_poll_interval)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(next_poll_at - now, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    def _get_operation(self, operation_name):
+        return self.speech_client.transport.operations_client.get_operation(operation_name)
+
+    async def poll(self, operation_names):
+        """Опрашивает переданные операции (параллельно, не более max_concurrent_polls одновременно)."""
+        semaphore = asyncio.Semaphore(self.max_concurrent_polls)
+
+        async def fetch(name):
+            async with semaphore:
+                return await asyncio.to_thread(self._get_operation, name)
+
+        results = await asyncio.gather(*(fetch(name) for name in operation_names), return_exceptions=True)
+        for name, operation in zip(operation_names, results):
+            entry = self.operations[name]
+            now = time.time()
+            with trace_context(entry['meeting']['file_id'], entry['meeting'].get('trace_id')):
+                try:
+                    if isinstance(operation, Exception):
+                        await self._poll_failed(name, entry, operation, now)
+                    elif operation.done:
+                        entry['poll_failures'] = 0
+                        await self._complete(name, operation)
+                    elif now - entry['submitted_at'] > self.max_operation_seconds:
+                        await self._expire(name, "превышено время ожидания распознавания")
+                    else:
+                        entry['poll_failures'] = 0
+                        self._schedule_next_poll(entry, operation, now)
+                except Exception as e:
+                    # Ошибка одной операции (например, при разборе ответа) не должна останавливать опрос остальных
+                    logger.error("Не удалось обработать операцию %s (%s): %s", name, entry['audio_label'], e, exc_info=True)
+                    if not entry.get('finishing'):
+                        await self._finish(name, f"Ошибка транскрипции: {e}", [], failed=True)
+        self._save_state()
+
+    async def _poll_failed(self, name, entry, error, now):
+        entry['poll_failures'] = entry.get('poll_failures', 0) + 1
+        logger.warning("Не удалось опросить операцию %s (попытка %d): %s", name, entry['poll_failures'], error)
+        if now - entry['submitted_at'] > self.max_operation_seconds:
+            await self._expire(name, "превышено время ожидания распознавания")
+        elif entry['poll_failures'] >= self.max_poll_failures:
+            await self._expire(name, f"операцию не удалось опросить {entry['poll_failures']} раз подряд ({error})")
+        else:
+            entry['interval'] = self._clamp_interval(entry['interval'] * 2)
+            entry['next_poll_at'] = now + entry['interval']
+
+    def _schedule_next_poll(self, entry, operation, now):
+        progress = 0
+        if operation.metadata.value:
+            progress = speech.LongRunningRecognizeMetadata.deserialize(operation.metadata.value).progress_percent
+        if 0 < progress < 100:
+            # Оценка оставшегося времени по прогрессу; опрашиваем на половине пути до конца
+            elapsed = now - entry['submitted_at']
+            remaining = elapsed * (100 - progress) / progress
+            entry['interval'] = self._clamp_interval(remaining / 2)
+        else:
+            entry['interval'] = self._clamp_interval(entry['interval'] * 1.5)
+        entry['next_poll_at'] = now + entry['interval']
+        logger.debug("Операция %s: прогресс %d%%, следующий опрос через %.0f с.", entry['audio_label'], progress, entry['interval'])
+
+    async def _complete(self, name, operation):
+        entry = self.operations[name]
+        transcript_words = []
+        if operation.HasField('error'):
+            logger.error("Операция транскрипции %s для %s завершилась с ошибкой: %s", name, entry['audio_label'], operation.error.message)
+            await self._finish(name, f"Ошибка транскрипции: {operation.error.message}", [], failed=True)
+            return
+        response = speech.LongRunningRecognizeResponse.deserialize(operation.response.value)
+        dialogue_text = await asyncio.to_thread(voicy.build_dialogue_from_response, response,
+                                                entry['audio_label'], transcript_words)
+        if dialogue_text is None:
+            await self._finish(name, voicy.NO_SPEECH_TEXT, [], failed=True)
+        else:
+            await self._finish(name, dialogue_text, transcript_words)
+
+    async def _expire(self, name, reason):
+        entry = self.operations[name]
+        logger.error("Операция транскрипции %s для %s прекращена: %s. Отменяю.", name, entry['audio_label'], reason)
+        try:
+            await asyncio.to_thread(self.speech_client.transport.operations_client.cancel_operation, name)
+        except Exception as e:
+            logger.warning("Не удалось отменить операцию %s: %s", name, e)
+        await self._finish(name, f"Ошибка транскрипции: {reason}.", [], failed=True)
+
+    async def _finish(self, name, dialogue_text, transcript_words, failed=False):
+        """Передает результат в on_done отдельной задачей; операция больше не опрашивается."""
+        entry = self.operations[name]
+        entry['finishing'] = True
+        task = asyncio.create_task(self._hand_off(name, entry, dialogue_text, transcript_words, failed))
+        self._handoff_tasks.add(task)
+        task.add_done_callback(self._handoff_tasks.discard)
+
+    async def _hand_off(self, name, entry, dialogue_text, transcript_words, failed):
+        try:
+            await asyncio.to_thread(voicy.delete_gcs_blob, self.storage_client.bucket(self.bucket_name).blob(entry['blob_name']))
+            await self.on_done(entry['meeting'], dialogue_text, entry['duration_minutes'], transcript_words, failed)
+        except Exception as e:
+            logger.error("Ошибка при обработке результата операции %s (%s): %s", name, entry['audio_label'], e, exc_info=True)
+        # Удаляем операцию из состояния только после обработки результата:
+        # при падении до этого момента результат будет получен повторно после перезапуска
+        self.operations.pop(name, None)
+        self._save_state()
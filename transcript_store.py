@@ -0,0 +1,197 @@
+import os
+import sys
+import gzip
+import json
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBlobStorage:
+    """Хранение объектов в локальной папке (запись атомарная: временный файл + rename)."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def uri(self, name):
+        return os.path.join(self.root, name)
+
+    def exists(self, name):
+        return os.path.exists(self.uri(name))
+
+    def read(self, name):
+        with open(self.uri(name), 'rb') as f:
+            return f.read()
+
+    def write(self, name, data):
+        path = self.uri(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class GCSBlobStorage:
+    """Хранение объектов в бакете Google Cloud Storage под заданным префиксом."""
+
+    def __init__(self, storage_client, bucket_name, prefix=''):
+        self.bucket_name = bucket_name
+        self.bucket = storage_client.bucket(bucket_name)
+        self.prefix = prefix.strip('/')
+
+    def _name(self, name):
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def uri(self, name):
+        return f"gs://{self.bucket_name}/{self._name(name)}"
+
+    def exists(self, name):
+        return self.bucket.blob(self._name(name)).exists()
+
+    def read(self, name):
+        return self.bucket.blob(self._name(name)).download_as_bytes()
+
+    def write(self, name, data):
+        # content_encoding не задаем, чтобы GCS не распаковывал объект при скачивании
+        self.bucket.blob(self._name(name)).upload_from_string(data, content_type='application/gzip')
+
+
+class TranscriptStore:
+    """
+    Хранилище полных транскриптов вне Google Таблицы.
+
+    Содержимое (текст + слова) сжимается gzip и адресуется по sha256 несжатого JSON:
+        blobs/<sha[:2]>/<sha>.json.gz
+    Для каждой встречи хранится указатель:
+        meetings/<meeting_id>.json  ->  {'meeting_id', 'sha256', 'uri', 'stats', 'meta', 'stored_at'}
+    Одинаковые транскрипты записываются один раз.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @staticmethod
+    def _blob_name(sha256):
+        return f"blobs/{sha256[:2]}/{sha256}.json.gz"
+
+    @staticmethod
+    def _meeting_name(meeting_id):
+        safe_id = "".join(c if c.isalnum() or c in '-_.' else '_' for c in str(meeting_id))
+        return f"meetings/{safe_id}.json"
+
+    @staticmethod
+    def transcript_stats(text, words=None):
+        """
+        Статистика транскрипта для строки таблицы: символы, слова, спикеры.
+        Элемент words может содержать несколько слов (сегмент локального движка).
+        """
+        words = words or []
+        speakers = {w.get('speaker') for w in words if w.get('speaker') is not None}
+        return {
+            'chars': len(text),
+            'words': sum(len(w['word'].split()) for w in words) if words else len(text.split()),
+            'speakers': len(speakers),
+        }
+
+    def put(self, meeting_id, text, words=None, meta=None):
+        """
+        Сохраняет транскрипт встречи.
+
+        Args:
+            meeting_id (str): ID встречи (ID файла на Google Drive).
+            text (str): Полный текст транскрипта.
+            words (list, optional): Слова распознавания ({'word', 'speaker', 'start', 'end'}).
+            meta (dict, optional): Дополнительные сведения (имя файла, длительность и т.п.).
+
+        Returns:
+            dict: Указатель на транскрипт (как его вернет get_pointer).
+        """
+        payload = json.dumps({'text': text, 'words': words or []}, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        sha256 = hashlib.sha256(payload).hexdigest()
+        blob_name = self._blob_name(sha256)
+        if not self.storage.exists(blob_name):
+            # mtime=0: одинаковое содержимое дает одинаковый архив
+            self.storage.write(blob_name, gzip.compress(payload, compresslevel=6, mtime=0))
+        else:
+            logger.info("Транскрипт %s уже есть в хранилище, повторная запись не нужна.", sha256)
+
+        pointer = {
+            'meeting_id': meeting_id,
+            'sha256': sha256,
+            'uri': self.storage.uri(blob_name),
+            'stats': self.transcript_stats(text, words),
+            'meta': meta or {},
+            'stored_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.storage.write(self._meeting_name(meeting_id), json.dumps(pointer, ensure_ascii=False).encode('utf-8'))
+        logger.info("Транскрипт встречи %s сохранен: %s", meeting_id, pointer['uri'])
+        return pointer
+
+    def get_pointer(self, meeting_id):
+        """Возвращает указатель на транскрипт встречи или None, если его нет."""
+        name = self._meeting_name(meeting_id)
+        if not self.storage.exists(name):
+            return None
+        return json.loads(self.storage.read(name).decode('utf-8'))
+
+    def get(self, meeting_id):
+        """
+        Возвращает сохраненный транскрипт встречи.
+
+        Returns:
+            dict: {'meeting_id', 'text', 'words', 'stats', 'meta', 'stored_at'} или None.
+        """
+        pointer = self.get_pointer(meeting_id)
+        if pointer is None:
+            return None
+        payload = json.loads(gzip.decompress(self.storage.read(self._blob_name(pointer['sha256']))).decode('utf-8'))
+        return {
+            'meeting_id': meeting_id,
+            'text': payload['text'],
+            'words': payload['words'],
+            'stats': pointer['stats'],
+            'meta': pointer['meta'],
+            'stored_at': pointer['stored_at'],
+        }
+
+
+def open_transcript_store(location, storage_client=None):
+    """
+    Открывает хранилище транскриптов: "gs://bucket/prefix" или путь к локальной папке.
+    """
+    if location.startswith('gs://'):
+        if storage_client is None:
+            raise ValueError("Для хранилища в Cloud Storage нужен storage_client.")
+        bucket_name, _, prefix = location[len('gs://'):].partition('/')
+        return TranscriptStore(GCSBlobStorage(storage_client, bucket_name, prefix))
+    return TranscriptStore(LocalBlobStorage(location))
+
+
+if __name__ == '__main__':
+    # Получение транскрипта по ID встречи: python transcript_store.py <meeting_id> [--json]
+    import config as conf
+
+    if len(sys.argv) < 2:
+        sys.exit("Использование: python transcript_store.py <meeting_id> [--json]")
+    client = None
+    if conf.TRANSCRIPT_STORE_URI.startswith('gs://'):
+        from google.cloud import storage
+        from google.oauth2 import service_account
+        client = storage.Client(credentials=service_account.Credentials.from_service_account_file(conf.SERVICE_ACCOUNT_FILE))
+    transcript = open_transcript_store(conf.TRANSCRIPT_STORE_URI, client).get(sys.argv[1])
+    if transcript is None:
+        sys.exit(f"Транскрипт встречи {sys.argv[1]} не найден.")
+    if '--json' in sys.argv[2:]:
+        print(json.dumps(transcript, ensure_ascii=False, indent=2))
+    else:
+        print(transcript['text'])
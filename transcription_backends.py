@@ -0,0 +1,275 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import math
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import voicy_functions as voicy
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:  # faster-whisper нужен только для локального движка
+    WhisperModel = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionBackend:
+    """
+    Интерфейс движка транскрибации.
+
+    Все движки возвращают тот же результат, что и voicy.transcribe_audio_file:
+    (dialogue_text, duration_minutes). Если передан words_out, он дополняется
+    элементами {'word', 'speaker', 'start', 'end'} для хранилища транскриптов.
+    Если текста встречи нет (ошибка или речь не распознана), выбрасывается
+    voicy.TranscriptionError с сообщением для таблицы.
+    """
+    name = None
+
+    def transcribe(self, audio_path, profile, duration_minutes=None, words_out=None):
+        raise NotImplementedError
+
+    def close(self):
+        """Освобождает ресурсы движка (пулы процессов, клиенты)."""
+
+
+class GoogleSpeechBackend(TranscriptionBackend):
+    """Google Cloud Speech-to-Text через Cloud Storage (текущий основной путь)."""
+    name = 'google'
+
+    def __init__(self, bucket_name, credentials_path):
+        self.bucket_name = bucket_name
+        self.credentials_path = credentials_path
+
+    def transcribe(self, audio_path, profile, duration_minutes=None, words_out=None):
+        return voicy.transcribe_audio_file(self.bucket_name, audio_path, self.credentials_path,
+                                           profile=profile, duration_minutes=duration_minutes, words_out=words_out,
+                                           raise_errors=True)
+
+
+# --- Локальный движок (faster-whisper / CTranslate2, только CPU) ---
+# Модель загружается один раз в каждом процессе пула (см. _init_whisper_worker).
+_worker_model = None
+_worker_settings = {}
+
+
+def _init_whisper_worker(model_size, compute_type, cpu_threads, beam_size):
+    global _worker_model, _worker_settings
+    _worker_model = WhisperModel(model_size, device='cpu', compute_type=compute_type,
+                                 cpu_threads=cpu_threads, num_workers=1)
+    _worker_settings = {'beam_size': beam_size}
+
+
+def _transcribe_whisper_chunk(chunk_path, language):
+    segments, _info = _worker_model.transcribe(
+        chunk_path,
+        language=language,
+        beam_size=_worker_settings['beam_size'],
+        vad_filter=True,
+    )
+    return [(segment.start, segment.end, segment.text.strip()) for segment in segments if segment.text.strip()]
+
+
+def whisper_language_for_profile(profile):
+    """
+    Код языка для Whisper ("ru-RU" -> "ru"). Если в профиле задано несколько
+    языков, возвращает None - Whisper определит язык сам.
+    """
+    if profile.get('alternative_language_codes'):
+        return None
+    return profile['language_code'].split('-')[0].lower()
+
+
+def split_audio_for_whisper(audio_path, output_dir, chunk_seconds, duration_seconds=0.0, overlap_seconds=0):
+    """
+    Режет аудио на моно-фрагменты (16 kHz WAV) с помощью ffmpeg: фрагмент i начинается
+    на i * chunk_seconds и длится chunk_seconds + overlap_seconds, чтобы слово на границе
+    целиком попало хотя бы в один фрагмент (см. merge_whisper_segments).
+    Если длительность неизвестна (0.0), фрагменты вырезаются, пока не кончится аудио.
+
+    Returns:
+        list: Кортежи (путь к фрагменту, начало фрагмента в секундах) по порядку.
+    """
+    chunk_count = math.ceil(duration_seconds / chunk_seconds) if duration_seconds > 0 else None
+    chunks = []
+    index = 0
+    while chunk_count is None or index < chunk_count:
+        offset = index * chunk_seconds
+        chunk_path = os.path.join(output_dir, f'chunk_{index:05d}.wav')
+        command = [
+            'ffmpeg', '-ss', str(offset), '-t', str(chunk_seconds + overlap_seconds),
+            '-i', audio_path,
+            '-ac', '1',
+            '-ar', '16000',
+            '-acodec', 'pcm_s16le',
+            '-vn',
+            '-y',
+            chunk_path
+        ]
+        result = subprocess.run(command, capture_output=True, text=True, check=False, timeout=600)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg не смог вырезать фрагмент {index} из {audio_path}: {result.stderr}")
+        # Фрагмент за концом аудио - только заголовок WAV
+        if chunk_count is None and os.path.getsize(chunk_path) <= 1024:
+            os.remove(chunk_path)
+            break
+        chunks.append((chunk_path, offset))
+        index += 1
+    return chunks
+
+
+def merge_whisper_segments(chunk_results):
+    """
+    Склеивает сегменты перекрывающихся фрагментов: сегмент следующего фрагмента,
+    середина которого приходится на уже распознанный участок (перекрытие), отбрасывается.
+
+    Args:
+        chunk_results: Пары (начало фрагмента, [(start, end, text), ...]) по порядку.
+
+    Returns:
+        list: Сегменты (start, end, text) с абсолютным временем.
+    """
+    merged = []
+    covered_until = 0.0
+    for offset, segments in chunk_results:
+        for start, end, text in segments:
+            start, end = offset + start, offset + end
+            if merged and (start + end) / 2 < covered_until:
+                continue
+            merged.append((start, end, text))
+            covered_until = max(covered_until, end)
+    return merged
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    Локальная транскрибация на CPU (faster-whisper, int8) без GPU и без Cloud Storage.
+
+    Аудио режется на перекрывающиеся фрагменты, которые распознаются параллельно в пуле процессов.
+    Пул общий для всех потоков, вызывающих transcribe (обработчики очереди).
+    Каждый процесс держит свою копию модели и использует cpu_threads потоков,
+    поэтому workers * cpu_threads не должно превышать числа ядер.
+    Диаризации нет: диалог возвращается сегментами по порядку, и words_out
+    заполняется с точностью до сегмента (speaker = None).
+    """
+    name = 'whisper'
+
+    def __init__(self, model_size='small', compute_type='int8', workers=None, cpu_threads=1,
+                 chunk_seconds=300, beam_size=1, chunk_overlap_seconds=10):
+        if WhisperModel is None:
+            raise RuntimeError("Локальный движок недоступен: установите пакет faster-whisper.")
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.cpu_threads = max(1, cpu_threads)
+        self.workers = workers or max(1, (os.cpu_count() or 1) // self.cpu_threads)
+        self.chunk_seconds = chunk_seconds
+        self.chunk_overlap_seconds = chunk_overlap_seconds
+        self.beam_size = beam_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                logger.info("Запуск пула локальной транскрибации: %s процессов, модель %s (%s), потоков на процесс: %s",
+                            self.workers, self.model_size, self.compute_type, self.cpu_threads)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_whisper_worker,
+                    initargs=(self.model_size, self.compute_type, self.cpu_threads, self.beam_size),
+                )
+            return self._pool
+
+    def _discard_pool(self, pool):
+        # Заменяем только сломанный пул: другой поток мог уже создать новый
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _map_chunks(self, chunk_paths, language):
+        # Если процесс пула погиб (например, не хватило памяти), пул остается сломанным
+        # для всех следующих файлов - пересоздаем его и повторяем один раз
+        for attempt in (1, 2):
+            pool = self._get_pool()
+            try:
+                return list(pool.map(_transcribe_whisper_chunk, chunk_paths, [language] * len(chunk_paths)))
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                if attempt == 2:
+                    raise
+                logger.warning("Пул локальной транскрибации сломан (процесс завершился аварийно), пересоздаю и повторяю.")
+
+    def transcribe(self, audio_path, profile, duration_minutes=None, words_out=None):
+        if duration_minutes is None:
+            duration_minutes = voicy.get_audio_duration_minutes(audio_path)
+        if not os.path.exists(audio_path):
+            logger.error("Ошибка: Аудиофайл %s не найден для транскрипции.", audio_path)
+            raise voicy.TranscriptionError("Ошибка: Исходный аудиофайл не найден для транскрипции.")
+
+        chunk_dir = tempfile.mkdtemp(prefix='whisper_chunks_', dir=os.path.dirname(os.path.abspath(audio_path)))
+        try:
+            chunks = split_audio_for_whisper(audio_path, chunk_dir, self.chunk_seconds,
+                                             duration_minutes * 60, self.chunk_overlap_seconds)
+            language = whisper_language_for_profile(profile)
+            logger.info("Локальная транскрибация %s: %s фрагментов, язык %s", audio_path, len(chunks), language or 'авто')
+            results = self._map_chunks([chunk_path for chunk_path, _offset in chunks], language)
+            segments = merge_whisper_segments(zip([offset for _chunk_path, offset in chunks], results))
+            lines = [text for _start, _end, text in segments]
+            if words_out is not None:
+                words_out.extend({'word': text, 'speaker': None, 'start': start, 'end': end}
+                                 for start, end, text in segments)
+            if not lines:
+                logger.warning("Транскрипция для %s не дала результатов.", audio_path)
+                raise voicy.TranscriptionError(voicy.NO_SPEECH_TEXT)
+            logger.info("Локальная транскрибация %s завершена успешно.", audio_path)
+            return "\n".join(lines), duration_minutes
+        except voicy.TranscriptionError:
+            raise
+        except Exception as e:
+            logger.error("Ошибка во время локальной транскрипции файла %s: %s", audio_path, e, exc_info=True)
+            raise voicy.TranscriptionError(f"Ошибка транскрипции: {e}") from e
+        finally:
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+
+    def close(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+BACKENDS = {
+    GoogleSpeechBackend.name: GoogleSpeechBackend,
+    LocalWhisperBackend.name: LocalWhisperBackend,
+}
+
+
+def create_transcription_backend(name, conf):
+    """
+    Создает движок транскрибации по имени ('google' или 'whisper') с настройками из config.
+
+    Raises:
+        ValueError: Неизвестное имя движка.
+        RuntimeError: Движок недоступен (например, не установлен faster-whisper).
+    """
+    if name == GoogleSpeechBackend.name:
+        return GoogleSpeechBackend(conf.CLOUD_STORAGE_BUCKET_NAME, conf.SERVICE_ACCOUNT_FILE)
+    if name == LocalWhisperBackend.name:
+        return LocalWhisperBackend(
+            model_size=getattr(conf, 'WHISPER_MODEL_SIZE', 'small'),
+            compute_type=getattr(conf, 'WHISPER_COMPUTE_TYPE', 'int8'),
+            workers=getattr(conf, 'WHISPER_WORKERS', None) or None,
+            cpu_threads=getattr(conf, 'WHISPER_CPU_THREADS', 1),
+            chunk_seconds=getattr(conf, 'WHISPER_CHUNK_SECONDS', 300),
+            chunk_overlap_seconds=getattr(conf, 'WHISPER_CHUNK_OVERLAP_SECONDS', 10),
+            beam_size=getattr(conf, 'WHISPER_BEAM_SIZE', 1),
+        )
+    raise ValueError(f"Неизвестный движок транскрибации: '{name}'. Доступны: {', '.join(BACKENDS)}")
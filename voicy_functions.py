@@ -12,12 +12,20 @@ from google.cloud import speech_v1 as speech, storage
 from google.oauth2.service_account import Credentials
 from googleapiclient.errors import HttpError
 from googleapiclient.discovery import build
+from google.auth.transport.requests import AuthorizedSession
 from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
 
+from drive_download import DRIVE_MEDIA_URL, DownloadError, MiB, parallel_ranged_download, remove_partial_download
+from voicy_logging import Sampler
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+# Настройка логирования - в voicy_logging.setup_logging (вызывается из main.py)
 logger = logging.getLogger(__name__)
 
+# Прореживание частых событий (прогресс скачивания, смена спикера)
+_download_progress_sampler = Sampler()
+_speaker_change_sampler = Sampler()
+
 # --- Остальные функции (authenticate, download_file_from_google_drive, etc.) остаются без изменений ---
 def authenticate(CREDENTIALS_FILE, SCOPES):
     """Аутентификация и создание сервисных объектов."""
@@ -30,53 +38,94 @@ def authenticate(CREDENTIALS_FILE, SCOPES):
     gc = gspread.service_account(filename=CREDENTIALS_FILE, scopes=SCOPES)
     return drive_service, sheets_service, docs_service, speech_client, storage_client, gc
 
-def download_file_from_google_drive(file_id, destination_path, credentials_path):
+DRIVE_READONLY_SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+
+
+def download_file_from_google_drive(file_id, destination_path, credentials_path, connections=4,
+                                    chunk_size=8 * MiB, max_attempts=3):
     """
     Скачивает файл с Google Drive по его идентификатору.
+
+    Файлы с известным размером скачиваются параллельно (connections Range-запросов,
+    см. drive_download.parallel_ranged_download) с проверкой md5Checksum. После сбоя,
+    в том числе перезапуска сервиса, докачиваются только недостающие части: состояние
+    хранится рядом с destination_path. Файлы без size в метаданных скачиваются
+    MediaIoBaseDownload блоками по chunk_size.
     Returns True on success, False on failure.
+
+    Raises:
+        DownloadError: Параллельное скачивание не удалось за max_attempts попыток.
+            Частично скачанный файл и состояние докачки сохраняются: следующий вызов продолжит с места остановки.
     """
     try:
-        credentials = service_account.Credentials.from_service_account_file(credentials_path)
+        credentials = service_account.Credentials.from_service_account_file(credentials_path, scopes=DRIVE_READONLY_SCOPES)
         service = build('drive', 'v3', credentials=credentials)
-        request = service.files().get_media(fileId=file_id)
-        logger.info(f"Начало скачивания файла {file_id} в {destination_path}")
+        metadata = service.files().get(fileId=file_id, fields='size, md5Checksum', supportsAllDrives=True).execute()
         # Ensure directory exists
-        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
-        fh = FileIO(destination_path, 'wb')
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            if status:
-                 logger.info(f"Скачивание {int(status.progress() * 100)}% завершено.")
-        logger.info(f"Файл {file_id} успешно скачан в {destination_path}.")
+        os.makedirs(os.path.dirname(os.path.abspath(destination_path)), exist_ok=True)
+
+        if metadata.get('size'):
+            total_size = int(metadata['size'])
+            logger.info("Начало скачивания файла %s (%d байт, соединений: %d) в %s", file_id, total_size, connections, destination_path)
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    parallel_ranged_download(
+                        lambda: AuthorizedSession(credentials),
+                        DRIVE_MEDIA_URL.format(file_id=file_id),
+                        destination_path,
+                        total_size,
+                        md5_checksum=metadata.get('md5Checksum'),
+                        connections=connections,
+                        initial_chunk_size=chunk_size,
+                    )
+                    break
+                except DownloadError as e:
+                    if attempt == max_attempts:
+                        raise
+                    logger.warning("Попытка %d скачивания файла %s не удалась (%s), докачиваю.", attempt, file_id, e)
+        else:
+            logger.info("Начало скачивания файла %s в %s (размер неизвестен, одним потоком)", file_id, destination_path)
+            request = service.files().get_media(fileId=file_id)
+            with FileIO(destination_path, 'wb') as fh:
+                downloader = MediaIoBaseDownload(fh, request, chunksize=chunk_size)
+                done = False
+                while not done:
+                    status, done = downloader.next_chunk()
+                    if status and _download_progress_sampler(file_id):
+                         logger.info("Скачивание %s: %d%% завершено.", file_id, int(status.progress() * 100))
+            _download_progress_sampler.reset(file_id)
+        logger.info("Файл %s успешно скачан в %s.", file_id, destination_path)
         return True # Успех
+    except DownloadError as e:
+        logger.error("Не удалось скачать файл %s за %d попыток: %s. Скачанная часть сохранена для докачки.", file_id, max_attempts, e)
+        raise
     except HttpError as error:
-        logger.error(f"Ошибка HttpError при скачивании файла {file_id}: {error}")
+        logger.error("Ошибка HttpError при скачивании файла %s: %s", file_id, error)
         return False # Неудача
     except Exception as e:
-        logger.error(f"Непредвиденная ошибка при скачивании файла {file_id}: {e}")
-        # Попытка удалить неполный файл, если он был создан
-        if os.path.exists(destination_path):
-            try:
-                os.remove(destination_path)
-                logger.info(f"Удален частично скачанный файл: {destination_path}")
-            except OSError as remove_error:
-                logger.error(f"Не удалось удалить частично скачанный файл {destination_path}: {remove_error}")
+        logger.error("Непредвиденная ошибка при скачивании файла %s: %s", file_id, e)
+        # Попытка удалить неполный файл (и состояние докачки), если он был создан
+        try:
+            remove_partial_download(destination_path)
+            logger.info("Удален частично скачанный файл: %s", destination_path)
+        except OSError as remove_error:
+            logger.error("Не удалось удалить частично скачанный файл %s: %s", destination_path, remove_error)
         return False # Неудача
 
 # --- ИЗМЕНЕНА: convert_mp4_to_wav (v2 - Стерео) ---
-def convert_mp4_to_wav(input_path, output_path):
+def convert_mp4_to_wav(input_path, output_path, channels=None):
     """
     Converts an input media file (like MP4) to a stereo WAV audio file using ffmpeg.
+    If channels is given (1 or 2, see channel_count_for_profile), the output is
+    downmixed/upmixed to that number of channels, otherwise the source layout is kept.
     Returns True on success, False on failure.
     """
     if os.path.exists(output_path):
         try:
             os.remove(output_path)
-            logger.info(f"Удален существующий файл: {output_path}")
+            logger.info("Удален существующий файл: %s", output_path)
         except OSError as e:
-            logger.error(f"Не удалось удалить существующий файл {output_path}: {e}")
+            logger.error("Не удалось удалить существующий файл %s: %s", output_path, e)
 
     try:
         command = [
@@ -89,204 +138,439 @@ def convert_mp4_to_wav(input_path, output_path):
             '-y',                    # Overwrite output file without asking
             output_path
         ]
-        logger.info(f"Запуск ffmpeg для конвертации {input_path} в СТЕРЕО {output_path}")
+        if channels:
+            command[3:3] = ['-ac', str(channels)]
+        logger.info("Запуск ffmpeg для конвертации %s в %s (каналов: %s)", input_path, output_path, channels or 'как в источнике')
         result = subprocess.run(command, capture_output=True, text=True, check=False, timeout=600)
 
         if result.returncode != 0:
-            logger.error(f"ffmpeg завершился с кодом ошибки {result.returncode} для файла {input_path}.")
-            logger.error(f"ffmpeg stderr: {result.stderr}")
-            logger.error(f"ffmpeg stdout: {result.stdout}")
+            logger.error("ffmpeg завершился с кодом ошибки %s для файла %s.", result.returncode, input_path)
+            logger.error("ffmpeg stderr: %s", result.stderr)
+            logger.error("ffmpeg stdout: %s", result.stdout)
             return False
 
         if not os.path.exists(output_path):
-            logger.error(f"Конвертация завершилась, но выходной файл {output_path} не найден!")
-            logger.error(f"ffmpeg stderr: {result.stderr}")
-            logger.error(f"ffmpeg stdout: {result.stdout}")
+            logger.error("Конвертация завершилась, но выходной файл %s не найден!", output_path)
+            logger.error("ffmpeg stderr: %s", result.stderr)
+            logger.error("ffmpeg stdout: %s", result.stdout)
             return False
         if os.path.getsize(output_path) == 0:
-             logger.error(f"Конвертация завершилась, но выходной файл {output_path} имеет нулевой размер!")
-             logger.error(f"ffmpeg stderr: {result.stderr}")
-             logger.error(f"ffmpeg stdout: {result.stdout}")
+             logger.error("Конвертация завершилась, но выходной файл %s имеет нулевой размер!", output_path)
+             logger.error("ffmpeg stderr: %s", result.stderr)
+             logger.error("ffmpeg stdout: %s", result.stdout)
              try:
                  os.remove(output_path)
              except OSError:
                  pass
              return False
 
-        logger.info(f"Аудио {input_path} успешно конвертировано в СТЕРЕО {output_path}.")
+        logger.info("Аудио %s успешно конвертировано в СТЕРЕО %s.", input_path, output_path)
         return True
 
     except subprocess.TimeoutExpired:
-        logger.error(f"Превышен таймаут ffmpeg при конвертации {input_path}.")
+        logger.error("Превышен таймаут ffmpeg при конвертации %s.", input_path)
         return False
     except subprocess.CalledProcessError as e:
-        logger.error(f"Ошибка CalledProcessError при конвертации аудио с помощью ffmpeg: {e}")
-        if e.stderr: logger.error(f"ffmpeg stderr: {e.stderr}")
-        if e.stdout: logger.error(f"ffmpeg stdout: {e.stdout}")
+        logger.error("Ошибка CalledProcessError при конвертации аудио с помощью ffmpeg: %s", e)
+        if e.stderr: logger.error("ffmpeg stderr: %s", e.stderr)
+        if e.stdout: logger.error("ffmpeg stdout: %s", e.stdout)
         return False
     except FileNotFoundError:
         logger.error("Критическая ошибка: Команда ffmpeg не найдена. Убедитесь, что ffmpeg установлен и добавлен в PATH.")
         return False
     except Exception as e:
-        logger.error(f"Непредвиденная ошибка при конвертации {input_path}: {e}")
+        logger.error("Непредвиденная ошибка при конвертации %s: %s", input_path, e)
         return False
 
-# --- ИЗМЕНЕНА: transcribe_audio_file (v4 - Стерео, latest_long) ---
-def transcribe_audio_file(CLOUD_STORAGE_BUCKET_NAME, audio_path, credentials_path, min_speakers=2, max_speakers=6):
+# --- Профили транскрибации (язык, модель, каналы, спикеры) ---
+DEFAULT_TRANSCRIPTION_PROFILE = {
+    'language_code': 'ru-RU',
+    'alternative_language_codes': [],
+    'model': 'latest_long',
+    'short_model': 'default',
+    'short_audio_max_minutes': 10.0,
+    'channel_mode': 'stereo',
+    'min_speakers': 2,
+    'max_speakers': 6,
+    'backend': 'google',
+}
+
+# Текст для таблицы, если речь в записи не распознана
+NO_SPEECH_TEXT = "Не удалось распознать речь."
+
+
+class TranscriptionError(Exception):
+    """Транскрибация не дала текста встречи; сообщение записывается в таблицу вместо транскрипта."""
+
+
+# Синхронный recognize принимает не более 1 минуты аудио
+SYNC_RECOGNIZE_MAX_MINUTES = 1.0
+
+CHANNEL_MODES = ('stereo', 'mono')
+
+
+def build_transcription_profile(record=None, defaults=None):
     """
-    Транскрибирует СТЕРЕО аудиофайл (WAV) с использованием Google Cloud Speech-to-Text (модель latest_long),
-    распознает разных спикеров (diarization) и возвращает диалог.
+    Собирает профиль транскрибации из строки таблицы маппинга.
 
-    Args:
-        CLOUD_STORAGE_BUCKET_NAME (str): Имя бакета Google Cloud Storage.
-        audio_path (str): Путь к локальному СТЕРЕО аудиофайлу WAV (16000 Hz рекомендуется).
-        credentials_path (str): Путь к файлу учетных данных сервисного аккаунта.
-        min_speakers (int): Минимальное ожидаемое количество спикеров.
-        max_speakers (int): Максимальное ожидаемое количество спикеров.
+    Поддерживаемые (необязательные) колонки:
+        language      - код языка или несколько через запятую ("ru-RU, en-US"):
+                        первый - основной, остальные - альтернативные.
+        model         - модель Speech-to-Text для обычных записей.
+        short_model   - модель для коротких встреч (пусто - не использовать маршрутизацию).
+        short_audio_max_minutes - до какой длительности (мин) встреча считается короткой.
+        channel_mode  - stereo | mono.
+        min_speakers, max_speakers - диапазон спикеров для диаризации.
+        backend       - движок транскрибации: google | whisper (см. transcription_backends).
+
+    Пустые и некорректные значения заменяются значениями из defaults
+    (или DEFAULT_TRANSCRIPTION_PROFILE).
 
     Returns:
-        tuple: (dialogue_text, duration_minutes)
-               dialogue_text (str): Расшифрованный диалог или сообщение об ошибке/None.
-               duration_minutes (float): Длительность в минутах или 0.0 при ошибке.
+        dict: Профиль с ключами как в DEFAULT_TRANSCRIPTION_PROFILE.
+    """
+    profile = dict(DEFAULT_TRANSCRIPTION_PROFILE)
+    if defaults:
+        profile.update({k: v for k, v in defaults.items() if v is not None})
+    profile['alternative_language_codes'] = list(profile['alternative_language_codes'] or [])
+    record = record or {}
+
+    languages = str(record.get('language', '') or '').strip()
+    if languages:
+        codes = [code.strip() for code in languages.replace(';', ',').split(',') if code.strip()]
+        profile['language_code'] = codes[0]
+        profile['alternative_language_codes'] = codes[1:]
+
+    for column in ('model', 'short_model'):
+        value = str(record.get(column, '') or '').strip()
+        if value:
+            profile[column] = value
+
+    profile['short_audio_max_minutes'] = _parse_number(record.get('short_audio_max_minutes'), float,
+                                                       profile['short_audio_max_minutes'], 'short_audio_max_minutes')
+
+    backend = str(record.get('backend', '') or '').strip().lower()
+    if backend:
+        profile['backend'] = backend
+
+    channel_mode = str(record.get('channel_mode', '') or '').strip().lower()
+    if channel_mode:
+        if channel_mode in CHANNEL_MODES:
+            profile['channel_mode'] = channel_mode
+        else:
+            logger.warning("Неизвестный channel_mode '%s' в таблице маппинга, используется '%s'.", channel_mode, profile['channel_mode'])
+
+    for column in ('min_speakers', 'max_speakers'):
+        value = str(record.get(column, '') or '').strip()
+        if value:
+            try:
+                profile[column] = int(value)
+            except ValueError:
+                logger.warning("Некорректное значение %s='%s' в таблице маппинга, используется %s.", column, value, profile[column])
+
+    if profile['min_speakers'] > profile['max_speakers']:
+        logger.warning("min_speakers (%s) больше max_speakers (%s), значения поменяны местами.", profile['min_speakers'], profile['max_speakers'])
+        profile['min_speakers'], profile['max_speakers'] = profile['max_speakers'], profile['min_speakers']
+
+    return profile
+
+
+def channel_count_for_profile(profile):
+    """Количество аудиоканалов, в которое нужно конвертировать запись для профиля."""
+    return 1 if profile.get('channel_mode') == 'mono' else 2
+
+
+def select_speech_model(profile, duration_minutes):
+    """
+    Выбирает модель Speech-to-Text по длительности записи.
+
+    Короткие встречи (не длиннее short_audio_max_minutes) отправляются в short_model,
+    остальные - в основную модель профиля. Если длительность неизвестна (0.0),
+    используется основная модель. Способ отправки (синхронно или через операцию)
+    от модели не зависит, см. use_sync_recognize.
+
+    Returns:
+        str: Модель.
+    """
+    short_model = profile.get('short_model')
+    short_max = profile.get('short_audio_max_minutes') or 0.0
+    if short_model and 0.0 < duration_minutes <= short_max:
+        return short_model
+    return profile['model']
+
+
+def use_sync_recognize(duration_minutes):
+    """Запись можно распознать синхронным recognize (без Cloud Storage и операции)."""
+    return 0.0 < duration_minutes <= SYNC_RECOGNIZE_MAX_MINUTES
+
+
+def get_audio_duration_minutes(audio_path):
+    """
+    Определяет длительность аудиофайла с помощью ffprobe.
+
+    Returns:
+        float: Длительность в минутах или 0.0, если определить не удалось.
     """
     duration_minutes = 0.0
-    # --- Определение длительности с помощью ffprobe (без изменений) ---
     try:
         if not os.path.exists(audio_path):
-            logger.error(f"Файл {audio_path} не найден перед вызовом ffprobe.")
+            logger.error("Файл %s не найден перед вызовом ffprobe.", audio_path)
             raise FileNotFoundError(f"Файл {audio_path} не найден")
 
         command = [
             'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
             '-of', 'default=noprint_wrappers=1:nokey=1', audio_path
         ]
-        logger.info(f"Запуск ffprobe для определения длительности файла: {audio_path}")
+        logger.info("Запуск ffprobe для определения длительности файла: %s", audio_path)
         result = subprocess.run(command, capture_output=True, text=True, check=False, timeout=60)
 
         if result.returncode != 0:
-            logger.warning(f"ffprobe не смог определить длительность файла {audio_path}. Код возврата: {result.returncode}")
-            logger.warning(f"ffprobe stderr: {result.stderr}")
+            logger.warning("ffprobe не смог определить длительность файла %s. Код возврата: %s", audio_path, result.returncode)
+            logger.warning("ffprobe stderr: %s", result.stderr)
         else:
             try:
                 duration_seconds = float(result.stdout.strip())
                 duration_minutes = duration_seconds / 60
-                logger.info(f"Длительность аудиофайла {audio_path}: {duration_minutes:.2f} минут.")
+                logger.info("Длительность аудиофайла %s: %.2f минут.", audio_path, duration_minutes)
             except ValueError:
-                logger.warning(f"Не удалось преобразовать вывод ffprobe ('{result.stdout.strip()}') в число для файла {audio_path}.")
+                logger.warning("Не удалось преобразовать вывод ffprobe ('%s') в число для файла %s.", result.stdout.strip(), audio_path)
     except FileNotFoundError as e:
-         logger.warning(f"Пропуск определения длительности из-за отсутствия файла: {e}")
+         logger.warning("Пропуск определения длительности из-за отсутствия файла: %s", e)
     except subprocess.TimeoutExpired:
-        logger.warning(f"Превышен таймаут ffprobe для файла {audio_path}. Длительность не определена.")
+        logger.warning("Превышен таймаут ffprobe для файла %s. Длительность не определена.", audio_path)
     except Exception as e:
-        logger.warning(f"Ошибка при определении длительности аудиофайла {audio_path} с помощью ffprobe: {e}")
+        logger.warning("Ошибка при определении длительности аудиофайла %s с помощью ffprobe: %s", audio_path, e)
+    return duration_minutes
+
+
+def build_recognition_config(profile, model):
+    """Собирает speech.RecognitionConfig для профиля транскрибации и выбранной модели."""
+    diarization_config = speech.SpeakerDiarizationConfig(
+        enable_speaker_diarization=True,
+        min_speaker_count=profile['min_speakers'],
+        max_speaker_count=profile['max_speakers'],
+    )
+    channel_count = channel_count_for_profile(profile)
+    return speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        sample_rate_hertz=16000,
+        language_code=profile['language_code'],
+        alternative_language_codes=profile['alternative_language_codes'],
+        model=model,
+        audio_channel_count=channel_count,
+        enable_separate_recognition_per_channel=channel_count > 1,
+        enable_automatic_punctuation=True,
+        diarization_config=diarization_config,
+        enable_word_time_offsets=True
+    )
+
+
+# --- ИЗМЕНЕНА: transcribe_audio_file (v5 - профили транскрибации, маршрутизация моделей) ---
+def transcribe_audio_file(CLOUD_STORAGE_BUCKET_NAME, audio_path, credentials_path, min_speakers=None, max_speakers=None,
+                          profile=None, duration_minutes=None, words_out=None, raise_errors=False):
+    """
+    Транскрибирует аудиофайл (WAV) с использованием Google Cloud Speech-to-Text,
+    распознает разных спикеров (diarization) и возвращает диалог.
+
+    Язык, модель, режим каналов и диапазон спикеров берутся из профиля
+    (см. build_transcription_profile), модель - по длительности (см. select_speech_model).
+    Записи не длиннее минуты распознаются синхронно, без загрузки в Cloud Storage.
+
+    Args:
+        CLOUD_STORAGE_BUCKET_NAME (str): Имя бакета Google Cloud Storage.
+        audio_path (str): Путь к локальному аудиофайлу WAV (16000 Hz), сконвертированному под профиль.
+        credentials_path (str): Путь к файлу учетных данных сервисного аккаунта.
+        min_speakers (int, optional): Переопределяет минимальное количество спикеров профиля.
+        max_speakers (int, optional): Переопределяет максимальное количество спикеров профиля.
+        profile (dict, optional): Профиль транскрибации. По умолчанию DEFAULT_TRANSCRIPTION_PROFILE.
+        duration_minutes (float, optional): Длительность, если уже известна; иначе определяется ffprobe.
+        words_out (list, optional): Если передан, дополняется словами распознавания
+            ({'word', 'speaker', 'start', 'end'}, время в секундах) для хранилища транскриптов.
+        raise_errors (bool): Вместо возврата сообщения об ошибке (или NO_SPEECH_TEXT)
+            выбросить TranscriptionError с этим сообщением.
+
+    Returns:
+        tuple: (dialogue_text, duration_minutes)
+               dialogue_text (str): Расшифрованный диалог или сообщение об ошибке/None.
+               duration_minutes (float): Длительность в минутах или 0.0 при ошибке.
+
+    Raises:
+        TranscriptionError: Только при raise_errors=True.
+    """
+    def fail(message):
+        if raise_errors:
+            raise TranscriptionError(message)
+        return message, duration_minutes
+
+    profile = dict(profile or build_transcription_profile())
+    if min_speakers is not None:
+        profile['min_speakers'] = min_speakers
+    if max_speakers is not None:
+        profile['max_speakers'] = max_speakers
+
+    if duration_minutes is None:
+        duration_minutes = get_audio_duration_minutes(audio_path)
+
+    model = select_speech_model(profile, duration_minutes)
+    config = build_recognition_config(profile, model)
 
-    # --- Транскрипция с распознаванием спикеров (Стерео, latest_long) ---
     credentials = service_account.Credentials.from_service_account_file(credentials_path)
     speech_client = speech.SpeechClient(credentials=credentials)
+
+    if use_sync_recognize(duration_minutes):
+        # --- Запись до минуты: синхронный recognize, аудио передается напрямую ---
+        try:
+            if not os.path.exists(audio_path):
+                logger.error("Ошибка: Аудиофайл %s не найден для транскрипции.", audio_path)
+                return fail("Ошибка: Исходный аудиофайл не найден для транскрипции.")
+            with open(audio_path, 'rb') as audio_file:
+                audio_content = speech.RecognitionAudio(content=audio_file.read())
+            logger.info("Запуск синхронной транскрипции (модель %s, язык %s) для %s...", model, profile['language_code'], audio_path)
+            response = speech_client.recognize(config=config, audio=audio_content)
+            dialogue_text = build_dialogue_from_response(response, audio_path, words_out)
+            return (dialogue_text, duration_minutes) if dialogue_text is not None else fail(NO_SPEECH_TEXT)
+        except TranscriptionError:
+            raise
+        except Exception as e:
+            logger.error("Ошибка во время транскрипции файла %s: %s", audio_path, e, exc_info=True)
+            return fail(f"Ошибка транскрипции: {e}")
+
+    # --- Транскрипция с распознаванием спикеров через Cloud Storage ---
     storage_client = storage.Client(credentials=credentials)
-    bucket = storage_client.bucket(CLOUD_STORAGE_BUCKET_NAME)
-    blob_name = os.path.basename(audio_path)
-    blob = bucket.blob(blob_name)
-    gcs_uri = f"gs://{CLOUD_STORAGE_BUCKET_NAME}/{blob_name}"
+    blob = None
 
     try:
         if not os.path.exists(audio_path):
-             logger.error(f"Ошибка: Попытка загрузить несуществующий файл {audio_path} в GCS.")
-             return "Ошибка: Исходный аудиофайл не найден для транскрипции.", duration_minutes
+             logger.error("Ошибка: Попытка загрузить несуществующий файл %s в GCS.", audio_path)
+             return fail("Ошибка: Исходный аудиофайл не найден для транскрипции.")
 
-        logger.info(f"Загрузка {audio_path} в {gcs_uri}...")
-        blob.upload_from_filename(audio_path)
-        logger.info(f"Аудиофайл успешно загружен в Cloud Storage: {gcs_uri}")
+        operation, blob = submit_long_running_recognition(speech_client, storage_client, CLOUD_STORAGE_BUCKET_NAME,
+                                                          audio_path, config)
+        logger.info("Ожидание завершения операции транскрипции...")
+        response = operation.result(timeout=3600) # Consider adjusting timeout based on audio length
 
-        audio_content = speech.RecognitionAudio(uri=gcs_uri)
+        dialogue_text = build_dialogue_from_response(response, audio_path, words_out)
+        return (dialogue_text, duration_minutes) if dialogue_text is not None else fail(NO_SPEECH_TEXT)
 
-        # --- Конфигурация с включенной диаризацией (v4 - Стерео, latest_long) ---
-        diarization_config = speech.SpeakerDiarizationConfig(
-            enable_speaker_diarization=True,
-            min_speaker_count=min_speakers,
-            max_speaker_count=max_speakers,
-        )
+    except TranscriptionError:
+        raise
+    except Exception as e:
+        logger.error("Ошибка во время транскрипции файла %s: %s", audio_path, e, exc_info=True)
+        return fail(f"Ошибка транскрипции: {e}")
+    finally:
+        # Очистка: удаляем загруженный файл из Cloud Storage
+        delete_gcs_blob(blob)
 
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-            sample_rate_hertz=16000,
-            language_code="ru-RU",
-            model='latest_long', # <-- ДОБАВЛЕНО: Используем последнюю модель для длинных аудио
-            audio_channel_count=2,
-            enable_separate_recognition_per_channel=True,
-            enable_automatic_punctuation=True,
-            diarization_config=diarization_config,
-            enable_word_time_offsets=True
-        )
-        # -------------------------------------------
 
-        logger.info(f"Запуск асинхронной транскрипции СТЕРЕО (модель latest_long) с диаризацией для {gcs_uri}...")
+def submit_long_running_recognition(speech_client, storage_client, bucket_name, audio_path, config):
+    """
+    Загружает аудиофайл в Cloud Storage и запускает long_running_recognize, не дожидаясь результата.
+    Если запустить распознавание не удалось, загруженный файл удаляется и исключение пробрасывается.
+
+    Returns:
+        tuple: (operation, blob) - операция google.api_core и загруженный объект GCS
+               (его нужно удалить после завершения операции, см. delete_gcs_blob).
+    """
+    bucket = storage_client.bucket(bucket_name)
+    blob_name = os.path.basename(audio_path)
+    blob = bucket.blob(blob_name)
+    gcs_uri = f"gs://{bucket_name}/{blob_name}"
+
+    logger.info("Загрузка %s в %s...", audio_path, gcs_uri)
+    blob.upload_from_filename(audio_path)
+    logger.info("Аудиофайл успешно загружен в Cloud Storage: %s", gcs_uri)
+
+    audio_content = speech.RecognitionAudio(uri=gcs_uri)
+    logger.info("Запуск асинхронной транскрипции (каналов: %s, модель %s, язык %s) с диаризацией для %s...",
+                config.audio_channel_count, config.model, config.language_code, gcs_uri)
+    try:
         operation = speech_client.long_running_recognize(config=config, audio=audio_content)
-        logger.info("Ожидание завершения операции транскрипции...")
-        response = operation.result(timeout=3600) # Consider adjusting timeout based on audio length
+    except Exception:
+        # Операция не запущена - загруженный файл никто больше не удалит
+        delete_gcs_blob(blob)
+        raise
+    return operation, blob
+
 
-        # --- Обработка результата с диаризацией (без изменений в логике) ---
-        if response.results:
-            final_result = response.results[-1]
-            if final_result.alternatives:
-                alternative = final_result.alternatives[0]
-                if alternative.words:
-                    logger.debug("Начало обработки слов для диаризации...")
-                    dialogue = []
-                    current_speaker_tag = None
-                    current_line = ""
-                    word_count_with_tags = 0
-
-                    for i, word_info in enumerate(alternative.words):
-                        speaker_tag = getattr(word_info, 'speaker_tag', None)
-
-                        if i < 10 or speaker_tag != current_speaker_tag:
-                             logger.debug(f"Слово: '{word_info.word}', Тег спикера: {speaker_tag}")
-
-                        if speaker_tag is not None:
-                             word_count_with_tags += 1
-
-                        if speaker_tag != current_speaker_tag:
-                            if current_line:
-                                dialogue.append(f"Спикер {current_speaker_tag}: {current_line.strip()}")
-                            current_speaker_tag = speaker_tag if speaker_tag is not None else "Неизвестный"
-                            current_line = word_info.word + " "
-                        else:
-                            current_line += word_info.word + " "
-
-                    if current_line:
-                         tag_to_use = current_speaker_tag if current_speaker_tag is not None else "Неизвестный"
-                         dialogue.append(f"Спикер {tag_to_use}: {current_line.strip()}")
-
-                    logger.debug(f"Обработка слов завершена. Слов с тегами: {word_count_with_tags} из {len(alternative.words)}")
-
-                    if dialogue and word_count_with_tags > 0:
-                        dialogue_text = "\n".join(dialogue)
-                        logger.info(f"Транскрипция с диаризацией для {audio_path} завершена успешно.")
-                        return dialogue_text, duration_minutes
+def delete_gcs_blob(blob):
+    """Удаляет временный объект из Cloud Storage (ошибки только логируются)."""
+    if blob is None:
+        return
+    try:
+        if blob.exists():
+            blob.delete()
+            logger.info("Файл gs://%s/%s удален из Cloud Storage.", blob.bucket.name, blob.name)
+    except Exception as e:
+         logger.warning("Не удалось удалить файл gs://%s/%s из Cloud Storage: %s", blob.bucket.name, blob.name, e)
+
+
+def build_dialogue_from_response(response, audio_path, words_out=None):
+    """
+    Собирает диалог по спикерам из ответа Speech-to-Text (recognize / long_running_recognize).
+    Если передан words_out, он дополняется словами с тегом спикера и временем (в секундах).
+
+    Returns:
+        str: Диалог вида "Спикер N: ...", общий транскрипт, если диаризация не дала
+             результата, или None, если речь не распознана.
+    """
+    if response.results:
+        final_result = response.results[-1]
+        if final_result.alternatives:
+            alternative = final_result.alternatives[0]
+            if alternative.words:
+                debug_enabled = logger.isEnabledFor(logging.DEBUG)
+                logger.debug("Начало обработки слов для диаризации...")
+                dialogue = []
+                current_speaker_tag = None
+                current_line = ""
+                word_count_with_tags = 0
+
+                for i, word_info in enumerate(alternative.words):
+                    speaker_tag = getattr(word_info, 'speaker_tag', None)
+
+                    if debug_enabled and (i < 10 or (speaker_tag != current_speaker_tag and _speaker_change_sampler(audio_path))):
+                         logger.debug("Слово: '%s', Тег спикера: %s", word_info.word, speaker_tag)
+
+                    if speaker_tag is not None:
+                         word_count_with_tags += 1
+
+                    if words_out is not None:
+                        words_out.append({
+                            'word': word_info.word,
+                            'speaker': speaker_tag,
+                            'start': word_info.start_time.total_seconds(),
+                            'end': word_info.end_time.total_seconds(),
+                        })
+
+                    if speaker_tag != current_speaker_tag:
+                        if current_line:
+                            dialogue.append(f"Спикер {current_speaker_tag}: {current_line.strip()}")
+                        current_speaker_tag = speaker_tag if speaker_tag is not None else "Неизвестный"
+                        current_line = word_info.word + " "
                     else:
-                         logger.warning(f"Диаризация для {audio_path} не дала результата (нет слов с тегами или диалог пуст), возвращаем общий транскрипт.")
-                         return alternative.transcript, duration_minutes
+                        current_line += word_info.word + " "
 
-                elif alternative.transcript:
-                     logger.warning(f"Диаризация для {audio_path} не дала результата (нет информации по словам), возвращаем общий транскрипт.")
-                     return alternative.transcript, duration_minutes
+                if current_line:
+                     tag_to_use = current_speaker_tag if current_speaker_tag is not None else "Неизвестный"
+                     dialogue.append(f"Спикер {tag_to_use}: {current_line.strip()}")
 
-        logger.warning(f"Транскрипция для {audio_path} не дала результатов.")
-        return "Не удалось распознать речь.", duration_minutes
-        # -------------------------------------------
+                _speaker_change_sampler.reset(audio_path)
+                logger.debug("Обработка слов завершена. Слов с тегами: %d из %d", word_count_with_tags, len(alternative.words))
 
-    except Exception as e:
-        logger.error(f"Ошибка во время транскрипции файла {audio_path}: {e}", exc_info=True)
-        return f"Ошибка транскрипции: {e}", duration_minutes
-    finally:
-        # Очистка: удаляем загруженный файл из Cloud Storage
-        try:
-            if storage_client and blob.exists():
-                blob.delete()
-                logger.info(f"Файл {gcs_uri} удален из Cloud Storage.")
-        except Exception as e:
-             logger.warning(f"Не удалось удалить файл {gcs_uri} из Cloud Storage: {e}")
+                if dialogue and word_count_with_tags > 0:
+                    dialogue_text = "\n".join(dialogue)
+                    logger.info("Транскрипция с диаризацией для %s завершена успешно.", audio_path)
+                    return dialogue_text
+                else:
+                     logger.warning("Диаризация для %s не дала результата (нет слов с тегами или диалог пуст), возвращаем общий транскрипт.", audio_path)
+                     return alternative.transcript
+
+            elif alternative.transcript:
+                 logger.warning("Диаризация для %s не дала результата (нет информации по словам), возвращаем общий транскрипт.", audio_path)
+                 return alternative.transcript
+
+    logger.warning("Транскрипция для %s не дала результатов.", audio_path)
+    return None
 
 
 # --- Остальные функции (openai_summarizer, read_mapping_sheet, find_media_files_on_drive, write_to_google_sheet, get_first_column_values, read_google_doc, find_new_media_files) остаются как были ---
@@ -307,27 +591,33 @@ def openai_summarizer(openai_api_key, transcribed_text, prompt, model="gpt-4o-20
         output_tokens = response.usage.completion_tokens
         return  model_answer, input_tokens, output_tokens
     except Exception as e:
-        logger.error(f"Ошибка при работе с OpenAI API: {e}")
+        logger.error("Ошибка при работе с OpenAI API: %s", e)
         # Возвращаем None и токены 0, чтобы обозначить ошибку
         return None, 0, 0
 
-def read_mapping_sheet(gc, spreadsheet_name_or_id, worksheet_name=None):
+def read_mapping_sheet(gc, spreadsheet_name_or_id, worksheet_name=None, default_profile=None):
     """
     Читает таблицу маппинга (email, folder_id, chat_id).
     Эта функция используется для получения списка папок для сканирования.
+    Необязательные колонки language, model, short_model, short_audio_max_minutes, channel_mode,
+    min_speakers, max_speakers, backend задают профиль транскрибации (см. build_transcription_profile),
+    priority (целое, больше - раньше) и weight (доля в очереди) - очередность обработки
+    (см. job_scheduler.JobScheduler).
 
     Args:
         gc: Авторизованный клиент gspread.
         spreadsheet_name_or_id (str): Имя или ID Google Таблицы с маппингом.
         worksheet_name (str, optional): Имя листа. По умолчанию первый лист.
+        default_profile (dict, optional): Значения профиля для пустых колонок.
 
     Returns:
-        list: Список словарей [ {'email': '...', 'folder_id': '...', 'chat_id': '...'}, ... ]
+        list: Список словарей [ {'email': '...', 'folder_id': '...', 'chat_id': '...', 'profile': {...},
+                                 'priority': 0, 'weight': 1.0}, ... ]
               или пустой список в случае ошибки или отсутствия данных.
     """
     mappings = []
     try:
-        logger.info(f"Чтение таблицы маппинга папок: {spreadsheet_name_or_id}")
+        logger.info("Чтение таблицы маппинга папок: %s", spreadsheet_name_or_id)
         # Пытаемся открыть по имени, если не ID
         try:
             spreadsheet = gc.open(spreadsheet_name_or_id)
@@ -347,21 +637,35 @@ def read_mapping_sheet(gc, spreadsheet_name_or_id, worksheet_name=None):
                 mappings.append({
                     'email': record.get('email', ''),
                     'folder_id': str(record['folder_id']).strip(),
-                    'chat_id': str(record['chat_id']).strip()
+                    'chat_id': str(record['chat_id']).strip(),
+                    'profile': build_transcription_profile(record, default_profile),
+                    'priority': _parse_number(record.get('priority'), int, 0, 'priority'),
+                    'weight': _parse_number(record.get('weight'), float, 1.0, 'weight'),
                 })
             else:
-                logger.warning(f"Пропуск строки в таблице маппинга из-за отсутствия folder_id/chat_id: {record}")
+                logger.warning("Пропуск строки в таблице маппинга из-за отсутствия folder_id/chat_id: %s", record)
 
-        logger.info(f"Найдено {len(mappings)} валидных записей в таблице маппинга папок.")
+        logger.info("Найдено %s валидных записей в таблице маппинга папок.", len(mappings))
         return mappings
 
     except gspread.exceptions.APIError as e:
-         logger.error(f"Ошибка API Google Sheets при чтении маппинга папок '{spreadsheet_name_or_id}': {e}")
+         logger.error("Ошибка API Google Sheets при чтении маппинга папок '%s': %s", spreadsheet_name_or_id, e)
          return []
     except Exception as e:
-        logger.error(f"Непредвиденная ошибка при чтении таблицы маппинга папок '{spreadsheet_name_or_id}': {e}")
+        logger.error("Непредвиденная ошибка при чтении таблицы маппинга папок '%s': %s", spreadsheet_name_or_id, e)
         return []
 
+def _parse_number(value, number_type, default, column):
+    """Число из ячейки таблицы маппинга; пустое или некорректное значение - default."""
+    value = str(value if value is not None else '').strip()
+    if not value:
+        return default
+    try:
+        return number_type(value.replace(',', '.'))
+    except ValueError:
+        logger.warning("Некорректное значение %s='%s' в таблице маппинга, используется %s.", column, value, default)
+        return default
+
 def find_media_files_on_drive(drive_service, folder_id, media_mime_types):
     """
     Находит все медиафайлы в **указанной папке** на Google Диске.
@@ -373,10 +677,12 @@ def find_media_files_on_drive(drive_service, folder_id, media_mime_types):
         media_mime_types (list): Список MIME-типов для поиска.
 
     Returns:
-        list: Список словарей [{'id': ..., 'name': ..., 'mimeType': ...}] или None/пустой список.
+        list: Список словарей [{'id': ..., 'name': ..., 'mimeType': ..., 'size': ..., 'createdTime': ...,
+              'videoMediaMetadata': {'durationMillis': ...}}] или None/пустой список
+              (size и videoMediaMetadata есть не у всех файлов).
     """
     media_files = []
-    logger.info(f"Поиск медиафайлов в папке ID: {folder_id}")
+    logger.info("Поиск медиафайлов в папке ID: %s", folder_id)
     try:
         for mime_type in media_mime_types:
             query = f"'{folder_id}' in parents and mimeType='{mime_type}' and trashed = false"
@@ -386,31 +692,31 @@ def find_media_files_on_drive(drive_service, folder_id, media_mime_types):
                     response = drive_service.files().list(
                         q=query,
                         spaces='drive',
-                        fields='nextPageToken, files(id, name, mimeType)',
+                        fields='nextPageToken, files(id, name, mimeType, size, createdTime, videoMediaMetadata(durationMillis))',
                         pageToken=page_token
                     ).execute()
 
                     files = response.get('files', [])
                     if files:
-                        media_files.extend([{'id': f['id'], 'name': f['name'], 'mimeType': f['mimeType']} for f in files])
-                        logger.info(f"Найдено {len(files)} файлов типа {mime_type} в папке {folder_id} на этой странице.")
+                        media_files.extend(files)
+                        logger.info("Найдено %s файлов типа %s в папке %s на этой странице.", len(files), mime_type, folder_id)
 
                     page_token = response.get('nextPageToken')
                     if not page_token:
                         break
 
                 except HttpError as error:
-                     logger.error(f"Ошибка HttpError при запросе файлов типа {mime_type} в папке {folder_id}: {error}")
+                     logger.error("Ошибка HttpError при запросе файлов типа %s в папке %s: %s", mime_type, folder_id, error)
                      break
                 except Exception as e:
-                    logger.error(f"Непредвиденная ошибка при запросе файлов типа {mime_type} в папке {folder_id}: {e}")
+                    logger.error("Непредвиденная ошибка при запросе файлов типа %s в папке %s: %s", mime_type, folder_id, e)
                     break
 
-        logger.info(f"Всего найдено {len(media_files)} медиафайлов в папке {folder_id}.")
+        logger.info("Всего найдено %s медиафайлов в папке %s.", len(media_files), folder_id)
         return media_files
 
     except Exception as e:
-        logger.error(f"Критическая ошибка при поиске медиафайлов в папке {folder_id}: {e}")
+        logger.error("Критическая ошибка при поиске медиафайлов в папке %s: %s", folder_id, e)
         return None
 
 def find_new_media_files(drive_files, spreadsheet_ids):
@@ -423,24 +729,34 @@ def find_new_media_files(drive_files, spreadsheet_ids):
     spreadsheet_ids: Список строк, представляющих id файлов из Google Таблицы.
 
   Returns:
-    Список словарей, где каждый словарь содержит 'id' и 'name' файлов,
-    которые есть на Google Диске, но отсутствуют в Google Таблице.
+    Список словарей, где каждый словарь содержит 'id' и 'name' файлов (и остальные
+    поля из drive_files), которые есть на Google Диске, но отсутствуют в Google Таблице.
   """
   new_files = []
   spreadsheet_ids_set = set(spreadsheet_ids)  # Преобразуем список в множество для быстрого поиска
 
   for file_info in drive_files:
     if file_info['id'] not in spreadsheet_ids_set:
-      new_files.append({'id': file_info['id'], 'name': file_info['name']})
+      new_files.append(dict(file_info))
 
   return new_files
 
 
+# Лимит Google Sheets на количество символов в одной ячейке
+SHEETS_CELL_CHAR_LIMIT = 50000
+
+
 def write_to_google_sheet(gc, spreadsheet_id, meeting_id, meeting_name, transcribation_text,
-                          summary, speech_minutes, input_openai, output_openai, source_identifier=None): # Добавлен source_identifier
+                          summary, speech_minutes, input_openai, output_openai, source_identifier=None, # Добавлен source_identifier
+                          transcript_pointer=None, excerpt_chars=500):
     """
     Записывает данные в Google Таблицу, используя её ID.
     Предполагается, что это ОСНОВНАЯ таблица для логирования обработанных файлов.
+
+    Если передан transcript_pointer (см. transcript_store.TranscriptStore.put), полный
+    транскрипт в таблицу не пишется: в transcribation_text попадает отрывок из
+    excerpt_chars символов, а в отдельные колонки - ссылка на транскрипт и статистика.
+    Без указателя текст обрезается до лимита ячейки Google Sheets.
     """
     try:
         # Открываем таблицу по ID
@@ -456,33 +772,51 @@ def write_to_google_sheet(gc, spreadsheet_id, meeting_id, meeting_name, transcri
             "output_openai",
             "source_identifier", # Добавлено новое поле
             "date_processed",
+            "transcript_uri",
+            "transcript_chars",
+            "transcript_words",
+            "transcript_speakers",
         ]
 
         current_header = worksheet.row_values(1)
         if current_header != header:
-             if not current_header:
+             if not current_header or current_header == header[:len(current_header)]:
+                 # Пустая таблица или старый заголовок без новых колонок - дописываем заголовок
                  worksheet.update('A1', [header])
              else:
-                 logger.warning(f"Заголовок в таблице с ID '{spreadsheet_id}' не совпадает с ожидаемым. Добавляю данные без обновления заголовка.")
+                 logger.warning("Заголовок в таблице с ID '%s' не совпадает с ожидаемым. Добавляю данные без обновления заголовка.", spreadsheet_id)
 
         current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        transcribation_text = transcribation_text if transcribation_text else "N/A" # Защита от None
+        if transcript_pointer:
+            if len(transcribation_text) > excerpt_chars:
+                transcribation_text = transcribation_text[:excerpt_chars] + "…"
+            stats = transcript_pointer.get('stats', {})
+            transcript_columns = [transcript_pointer.get('uri', ''), stats.get('chars', ''),
+                                  stats.get('words', ''), stats.get('speakers', '')]
+        else:
+            if len(transcribation_text) > SHEETS_CELL_CHAR_LIMIT:
+                logger.warning("Транскрипт %s длиннее лимита ячейки (%s символов) и будет обрезан.", meeting_id, len(transcribation_text))
+                transcribation_text = transcribation_text[:SHEETS_CELL_CHAR_LIMIT - 1] + "…"
+            transcript_columns = ['', '', '', '']
         row_data = [
             meeting_id,
             meeting_name,
-            transcribation_text if transcribation_text else "N/A", # Защита от None
+            transcribation_text,
             summary if summary else "N/A", # Защита от None
             f"{speech_minutes:.2f}" if isinstance(speech_minutes, (int, float)) else str(speech_minutes), # Форматируем минуты
             input_openai,
             output_openai,
             source_identifier if source_identifier else '', # Добавляем идентификатор источника
-            current_date
+            current_date,
+            *transcript_columns
         ]
         worksheet.append_row(row_data, value_input_option='USER_ENTERED')
-        logger.info(f"Данные по {meeting_id} успешно записаны в Google Таблицу с ID '{spreadsheet_id}'.")
+        logger.info("Данные по %s успешно записаны в Google Таблицу с ID '%s'.", meeting_id, spreadsheet_id)
     except gspread.exceptions.APIError as e:
-        logger.error(f"Ошибка API Google Sheets при записи в таблицу с ID '{spreadsheet_id}': {e}")
+        logger.error("Ошибка API Google Sheets при записи в таблицу с ID '%s': %s", spreadsheet_id, e)
     except Exception as e:
-        logger.error(f"Ошибка при записи в Google Таблицу с ID '{spreadsheet_id}': {e}")
+        logger.error("Ошибка при записи в Google Таблицу с ID '%s': %s", spreadsheet_id, e)
 
 def get_first_column_values(gc, spreadsheet_id, worksheet_name=None):
     """
@@ -500,20 +834,20 @@ def get_first_column_values(gc, spreadsheet_id, worksheet_name=None):
     try:
         # Открываем таблицу по ID
         spreadsheet = gc.open_by_key(spreadsheet_id)
-        logger.info(f"Чтение первого столбца из таблицы с ID: {spreadsheet_id}")
+        logger.info("Чтение первого столбца из таблицы с ID: %s", spreadsheet_id)
         worksheet = spreadsheet.worksheet(worksheet_name) if worksheet_name else spreadsheet.sheet1
 
         values = worksheet.col_values(1)
         return values
     except gspread.exceptions.APIError as e:
-        logger.error(f"Ошибка API Google Sheets при чтении из таблицы с ID {spreadsheet_id}: {e}")
+        logger.error("Ошибка API Google Sheets при чтении из таблицы с ID %s: %s", spreadsheet_id, e)
         return None
     except Exception as e:
         # Добавим логирование конкретной ошибки сети, если возможно
         if isinstance(e, ConnectionError) or 'RemoteDisconnected' in str(e):
-             logger.error(f"Ошибка сети при чтении из Google Таблицы с ID {spreadsheet_id}: {e}")
+             logger.error("Ошибка сети при чтении из Google Таблицы с ID %s: %s", spreadsheet_id, e)
         else:
-             logger.error(f"Непредвиденная ошибка при чтении из Google Таблицы с ID {spreadsheet_id}: {e}")
+             logger.error("Непредвиденная ошибка при чтении из Google Таблицы с ID %s: %s", spreadsheet_id, e)
         return None
 
 def read_google_doc(docs_service, document_id):
@@ -522,7 +856,7 @@ def read_google_doc(docs_service, document_id):
     Используется для чтения промпта OpenAI из КОНКРЕТНОГО документа.
     """
     try:
-        logger.info(f"Чтение Google Doc с ID: {document_id}")
+        logger.info("Чтение Google Doc с ID: %s", document_id)
         document = docs_service.documents().get(documentId=document_id).execute()
         content = ""
         # Проверяем наличие 'body' и 'content' перед доступом
@@ -540,15 +874,15 @@ def read_google_doc(docs_service, document_id):
                                 if text_run:
                                     content += text_run.get('content', '')
         if content:
-            logger.info(f"Документ {document_id} успешно прочитан.")
+            logger.info("Документ %s успешно прочитан.", document_id)
             return content
         else:
-            logger.warning(f"Документ {document_id} пуст или не содержит текстовых элементов.")
+            logger.warning("Документ %s пуст или не содержит текстовых элементов.", document_id)
             return "" # Возвращаем пустую строку, а не None
     except HttpError as err:
-        logger.error(f"Ошибка HttpError при чтении Google Doc ID {document_id}: {err}")
+        logger.error("Ошибка HttpError при чтении Google Doc ID %s: %s", document_id, err)
         return None # Ошибка чтения
     except Exception as e:
-        logger.error(f"Непредвиденная ошибка при чтении Google Doc ID {document_id}: {e}")
+        logger.error("Непредвиденная ошибка при чтении Google Doc ID %s: %s", document_id, e)
         return None # Ошибка чтения
 
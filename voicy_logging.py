@@ -0,0 +1,153 @@
+import sys
+import json
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# Идентификаторы, которые попадают в каждую запись лога, пока обрабатывается файл.
+# contextvars переносятся в asyncio-задачи и в asyncio.to_thread.
+trace_id_var = contextvars.ContextVar('trace_id', default=None)
+meeting_id_var = contextvars.ContextVar('meeting_id', default=None)
+
+# Шумные библиотеки по умолчанию не пишут DEBUG/INFO
+DEFAULT_MODULE_LEVELS = {
+    'google': 'WARNING',
+    'googleapiclient': 'WARNING',
+    'google_auth_httplib2': 'WARNING',
+    'httplib2': 'WARNING',
+    'urllib3': 'WARNING',
+    'grpc': 'WARNING',
+    'httpx': 'WARNING',
+    'httpcore': 'WARNING',
+    'openai': 'WARNING',
+    'telegram': 'INFO',
+}
+
+_STANDARD_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'trace_id', 'meeting_id'}
+_sample_every = 100
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def trace_context(meeting_id, trace_id=None):
+    """
+    Привязывает meeting_id и trace_id ко всем записям лога внутри блока.
+
+    Returns:
+        str: trace_id (новый, если не передан).
+    """
+    trace_id = trace_id or new_trace_id()
+    trace_token = trace_id_var.set(trace_id)
+    meeting_token = meeting_id_var.set(meeting_id)
+    try:
+        yield trace_id
+    finally:
+        meeting_id_var.reset(meeting_token)
+        trace_id_var.reset(trace_token)
+
+
+class TraceFilter(logging.Filter):
+    """Добавляет в запись trace_id и meeting_id текущего контекста."""
+
+    def filter(self, record):
+        record.trace_id = trace_id_var.get()
+        record.meeting_id = meeting_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON (удобно для journalctl | grep / jq)."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'trace_id', None):
+            entry['trace_id'] = record.trace_id
+            entry['meeting_id'] = record.meeting_id
+        # Поля, переданные через extra={...}
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Прежний текстовый формат с trace_id, если он есть, и полями extra={...} в конце строки."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        # Поля extra - перед traceback, который Formatter.format добавляет после сообщения
+        extra = {key: value for key, value in record.__dict__.items() if key not in _STANDARD_RECORD_ATTRS}
+        if extra:
+            line += ' ' + json.dumps(extra, ensure_ascii=False, default=str)
+        return line
+
+    def format(self, record):
+        line = super().format(record)
+        if getattr(record, 'trace_id', None):
+            line = f"[{record.trace_id} {record.meeting_id}] {line}"
+        return line
+
+
+class Sampler:
+    """
+    Прореживание частых событий: пропускает первое и каждое N-е событие по ключу.
+
+        progress_sampler = Sampler()
+        if progress_sampler(file_id):
+            logger.info("...", ...)
+    """
+
+    def __init__(self, every=None):
+        self.every = every
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, key=''):
+        every = self.every or _sample_every
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % every == 0
+
+    def reset(self, key=''):
+        with self._lock:
+            self._counts.pop(key, None)
+
+
+def setup_logging(level='INFO', module_levels=None, json_output=True, sample_every=100, stream=None):
+    """
+    Настраивает корневой логгер: JSON (или текст) в stderr, trace_id/meeting_id
+    в каждой записи, уровни по модулям (DEFAULT_MODULE_LEVELS + module_levels).
+    """
+    global _sample_every
+    _sample_every = max(1, sample_every)
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.addFilter(TraceFilter())
+    handler.setFormatter(JsonFormatter() if json_output else TextFormatter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    for name, module_level in {**DEFAULT_MODULE_LEVELS, **(module_levels or {})}.items():
+        logging.getLogger(name).setLevel(module_level)